@@ -1,4 +1,7 @@
 from .server.__main__ import SimpleRequestServer, DaemonEntityManager
+from .server.broker import BrokerServer
+from .server.remote import RemoteWorker, WorkerBroker
+from .server.shard import ShardedBroker
 from .client.cli import SimpleCLIClient
 from .client.asy import SimpleAsyncClient
 
@@ -16,6 +19,10 @@ except Exception as e:
 
 __all__ = [
     "SimpleRequestServer",
+    "BrokerServer",
+    "WorkerBroker",
+    "RemoteWorker",
+    "ShardedBroker",
     "SimpleCLIClient",
     "SimpleAsyncClient",
     "DaemonEntityManager",
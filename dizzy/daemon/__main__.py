@@ -13,18 +13,32 @@ import argparse
 import json
 import logging
 from pathlib import Path
+import signal
 import sys
 import zmq
 import asyncio
 
-from . import SimpleRequestServer, SimpleCLIClient, SettingsManager
+from . import (
+    BrokerServer,
+    RemoteWorker,
+    ShardedBroker,
+    SimpleRequestServer,
+    SimpleCLIClient,
+    SettingsManager,
+    WorkerBroker,
+)
 from .abstract_protocol import BaseProtocol
 
 data_root = SettingsManager(write_to_disk=True).data_root
 
-async def server(port=5555):
+async def server(port=5555, max_in_flight=16, max_pending=128):
     try:
-        server = SimpleRequestServer(protocol_dir=data_root, port=port)
+        server = SimpleRequestServer(
+            protocol_dir=data_root,
+            port=port,
+            max_in_flight=max_in_flight,
+            max_pending=max_pending,
+        )
     except zmq.error.ZMQError as e:
         print(e)
         sys.exit(1)
@@ -35,6 +49,78 @@ async def server(port=5555):
         print("Server stopped.")
 
 
+def broker(port=5555, workers=2, backend=None, max_in_flight=16, max_pending=128):
+    try:
+        broker = BrokerServer(
+            port=port,
+            workers=workers,
+            backend=backend,
+            protocol_dir=data_root,
+            max_in_flight=max_in_flight,
+            max_pending=max_pending,
+        )
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+    broker.run()
+    print("Broker stopped.")
+
+
+def sharded(port=5555, worker_port=5556, workers=0, max_in_flight=16):
+    settings = SettingsManager().settings
+    try:
+        broker = ShardedBroker(
+            list(settings.default_entities),
+            shards=settings.shards,
+            workers=workers,
+            port=port,
+            worker_port=worker_port,
+            protocol_dir=data_root,
+            max_in_flight=max_in_flight,
+        )
+    except (RuntimeError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+
+    try:
+        broker.run()
+    except KeyboardInterrupt:
+        pass
+    print("Broker stopped.")
+
+
+def worker_broker(port=5555, worker_port=5556, max_pending=128):
+    try:
+        broker = WorkerBroker(
+            port=port,
+            worker_port=worker_port,
+            max_pending=max_pending,
+        )
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+    try:
+        broker.run()
+    except KeyboardInterrupt:
+        pass
+    print("Broker stopped.")
+
+
+async def remote_worker(connect: str, max_in_flight=16):
+    worker = RemoteWorker(
+        connect, protocol_dir=data_root, max_in_flight=max_in_flight
+    )
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.drain)
+
+    await worker.run()
+    print("Worker stopped.")
+
+
 def client(address="localhost", port=5555):
     client = SimpleCLIClient(address=address, port=port)
 
@@ -54,7 +140,9 @@ def add_file_handler(filename):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "mode", choices=["server", "client"], help="Specify either 'server' or 'client'"
+        "mode",
+        choices=["server", "client", "broker", "worker"],
+        help="Specify 'server', 'client', or 'broker' / 'worker' for remote worker nodes",
     )
     parser.add_argument(
         "-v",
@@ -77,6 +165,47 @@ def main():
         default="localhost",
         help="Specify the address to connect to",
     )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=16,
+        help="Specify how many requests the server handles concurrently",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=128,
+        help="Specify how many requests may wait before new ones are rejected",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=0,
+        help="Run the server as a broker over this many worker processes",
+    )
+    parser.add_argument(
+        "--backend",
+        default=None,
+        help="Specify the broker's backend endpoint (ipc:// or tcp://), random tcp port by default",
+    )
+
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="Partition the entities across shard processes, see settings.shards",
+    )
+    parser.add_argument(
+        "--worker-port",
+        type=int,
+        default=5556,
+        help="Specify the port workers register on, in broker and sharded mode",
+    )
+    parser.add_argument(
+        "--connect",
+        default="tcp://localhost:5556",
+        help="Specify the broker endpoint to register with, in worker mode",
+    )
 
     args = parser.parse_args()
     print("Using data root:", data_root)
@@ -86,9 +215,44 @@ def main():
         format="[%(levelname)s] %(name)s:%(lineno)d: %(message)s",
     )
 
-    if args.mode == "server":
+    if args.mode == "server" and args.sharded:
+        add_file_handler(data_root / "server.log")
+        sharded(
+            port=args.port,
+            worker_port=args.worker_port,
+            workers=args.workers,
+            max_in_flight=args.max_in_flight,
+        )
+    elif args.mode == "server" and args.workers > 0:
+        add_file_handler(data_root / "server.log")
+        broker(
+            port=args.port,
+            workers=args.workers,
+            backend=args.backend,
+            max_in_flight=args.max_in_flight,
+            max_pending=args.max_pending,
+        )
+    elif args.mode == "server":
         add_file_handler(data_root / "server.log")
-        asyncio.run(server(port=args.port))
+        asyncio.run(
+            server(
+                port=args.port,
+                max_in_flight=args.max_in_flight,
+                max_pending=args.max_pending,
+            )
+        )
+    elif args.mode == "broker":
+        add_file_handler(data_root / "broker.log")
+        worker_broker(
+            port=args.port,
+            worker_port=args.worker_port,
+            max_pending=args.max_pending,
+        )
+    elif args.mode == "worker":
+        add_file_handler(data_root / "worker.log")
+        asyncio.run(
+            remote_worker(connect=args.connect, max_in_flight=args.max_in_flight)
+        )
     elif args.mode == "client":
         add_file_handler(data_root / "client.log")
         asyncio.run(client(address=args.address, port=args.port))
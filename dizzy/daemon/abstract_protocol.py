@@ -14,6 +14,8 @@ Status = Literal[
     "finished_with_errors",
     "cancelled",
     "stopped",
+    "overloaded",
+    "expired",
 ]
 
 
@@ -22,6 +24,9 @@ class BaseRequest(BaseModel):
     id: Optional[str] = None
     ctx: Dict[str, Any] = Field(default_factory=dict)
     step_options: Dict[str, Any] = Field(default_factory=dict)
+    # Unix time, or seconds after the server receives it, past which the request is dropped.
+    deadline: Optional[float] = None
+    timeout: Optional[float] = None
 
     class Config:
         populate_by_name = True
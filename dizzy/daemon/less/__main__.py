@@ -6,6 +6,7 @@ from typing import Optional
 
 from ..abstract_protocol import BaseProtocol, DefaultProtocol
 from ...entity.manager import EntityManager
+from ...utils import DependencyError
 
 logger = logging.getLogger(__name__)
 
@@ -77,9 +78,16 @@ def handle_entity_workflow(request, response, entity_manager: LocalEntityManager
         logger.exception(e)
         response.add_error("KeyError", str(e))
         ctx = {}
+    except DependencyError as e:
+        response.add_error("DependencyError", str(e))
+        ctx = {}
 
     response.ctx = request.ctx
     response.set_result(ctx["workflow"]["result"] if "workflow" in ctx else None)
+    if "workflow" in ctx:
+        response.add_info(
+            "executions_saved", str(ctx["workflow"]["executions"]["saved"])
+        )
 
 
 def argparser():
@@ -1,12 +1,15 @@
 import asyncio
 import json
 import logging
+import time
 import uuid
 import importlib
 import zmq
 import zmq.asyncio
 from pathlib import Path
 from dizzy import EntityManager
+from dizzy.service import TaskExecutor
+from dizzy.utils import DependencyError
 from ..abstract_protocol import BaseProtocol, DefaultProtocol
 from ..settings import SettingsManager
 
@@ -14,10 +17,17 @@ logger = logging.getLogger(__name__)
 
 
 class DaemonEntityManager(EntityManager):
-    def __init__(self, protocol_dir=None):
+    """Loads the data root's common services and default entities.
+
+    With `entities`, only those of the default entities are loaded, so a shard's
+    process never imports the task modules of the other shards' entities.
+    """
+
+    def __init__(self, protocol_dir=None, entities: list[str] = None):
         super().__init__()
 
         self.protocol_dir = protocol_dir
+        self.only_entities = entities
         self.settings_manager = SettingsManager(
             write_to_disk=True, live_reload=False, data_root=self.protocol_dir
         )
@@ -28,24 +38,87 @@ class DaemonEntityManager(EntityManager):
     def load(self):
         self.settings_manager.load_settings()
         settings = self.settings_manager.settings
-        super().load(settings.common_services, settings.default_entities)
+        self.executor = TaskExecutor(**settings.executor)
+        self.csm.lazy = settings.lazy_tasks
+
+        entities = settings.default_entities
+        if self.only_entities is not None:
+            entities = {e: f for e, f in entities.items() if e in self.only_entities}
+        super().load(settings.common_services, entities, settings.load_workers)
         logger.debug(f"Activate protocol directory: {self.protocol_dir}")
 
 
+def encode_response(response) -> bytes:
+    try:
+        logger.debug(f"Response: {response}")
+        return response.model_dump_json().encode()
+    except Exception as e:
+        logger.error(f"Error serializing response: {e}")
+        response.add_error("SerializationError", str(e))
+        return response.model_dump_json().encode()
+
+
+def rejection(protocol: BaseProtocol, message: bytes, status, error: str, reason: str):
+    """Build the response to a request that will not be run."""
+    try:
+        request = protocol.Request.model_validate_json(message.decode())
+    except Exception:
+        request = protocol.Request()
+    response = protocol.Response.from_request(request, status=status)
+    response.add_error(error, reason)
+    return response
+
+
 class SimpleRequestServer:
-    def __init__(self, protocol: BaseProtocol = DefaultProtocol, address="*", port=5555, protocol_dir=None):
+    """Serves requests on a ROUTER socket.
+
+    Receiving is decoupled from execution, up to `max_in_flight` requests are
+    handled concurrently and each response is routed back to its requester's
+    identity as soon as it is ready, regardless of arrival order.
+
+    At most `max_pending` requests wait for a free slot, any more are rejected at
+    once as "overloaded". Requests whose deadline passes while waiting are dropped
+    as "expired" instead of being run.
+
+    With `connect`, the server is a broker worker instead, a DEALER connected to
+    the broker's backend rather than a ROUTER bound to `address:port`. `entities`
+    restricts the default entities it loads, see DaemonEntityManager.
+    """
+
+    def __init__(
+        self,
+        protocol: BaseProtocol = DefaultProtocol,
+        address="*",
+        port=5555,
+        protocol_dir=None,
+        max_in_flight: int = 16,
+        max_pending: int = 128,
+        connect: str = None,
+        drain_idle: float = 0.5,
+        entities: list[str] = None,
+    ):
         self._check_and_load_protocol(protocol, protocol_dir)
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+        self.shed = {"overloaded": 0, "expired": 0}
+        self.drain_idle = drain_idle
+        self.draining = False
 
         self.context = zmq.asyncio.Context()
-        self.frontend = self.context.socket(zmq.ROUTER)
 
-        try:
-            self.frontend.bind(f"tcp://{address}:{port}")
-        except zmq.error.ZMQError as e:
-            logger.error(f"Error binding to {address}:{port}: {e}")
-            raise RuntimeError(f"Error binding to {address}:{port}: {e}")
+        if connect is not None:
+            self.frontend = self.context.socket(zmq.DEALER)
+            self.frontend.connect(connect)
+        else:
+            self.frontend = self.context.socket(zmq.ROUTER)
+
+            try:
+                self.frontend.bind(f"tcp://{address}:{port}")
+            except zmq.error.ZMQError as e:
+                logger.error(f"Error binding to {address}:{port}: {e}")
+                raise RuntimeError(f"Error binding to {address}:{port}: {e}")
 
-        self.entity_manager = DaemonEntityManager(protocol_dir)
+        self.entity_manager = DaemonEntityManager(protocol_dir, entities)
 
         self.clients = {}
 
@@ -53,34 +126,100 @@ class SimpleRequestServer:
         logger.debug("Server running...")
 
         self.running = True
-        while self.running != False:
-            if self.frontend.closed:
-                break
+        self.pending = asyncio.Queue(maxsize=self.max_pending)
+        workers = [
+            asyncio.create_task(self._request_worker())
+            for _ in range(self.max_in_flight)
+        ]
 
+        last_message = time.time()
+        try:
+            while self.running != False:
+                if self.frontend.closed:
+                    break
+
+                try:
+                    if not await self.frontend.poll(100):
+                        idle = time.time() - last_message
+                        if self.draining and idle >= self.drain_idle:
+                            break
+                        continue
+
+                    [identity, _, message] = await self.frontend.recv_multipart()
+                    last_message = time.time()
+                except (zmq.error.ZMQError, asyncio.exceptions.CancelledError):
+                    logger.debug("Server stopped.")
+                    break
+                except KeyboardInterrupt:
+                    logger.debug("Server stopped.")
+                    break
+                except Exception as e:
+                    logger.exception(e)
+                    continue
+
+                logger.debug("Queueing request...")
+                try:
+                    self.pending.put_nowait((identity, message, time.time()))
+                except asyncio.QueueFull:
+                    await self.reject_request(
+                        identity, message, "overloaded", "Server overloaded, retry later"
+                    )
+        finally:
+            if self.draining:
+                await self.pending.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+            if self.draining:
+                logger.debug("Server drained.")
+                self.stop()
+
+    async def _request_worker(self):
+        while True:
+            identity, message, received_at = await self.pending.get()
             try:
-                [identity, _, message] = await self.frontend.recv_multipart()
-            except (zmq.error.ZMQError, asyncio.exceptions.CancelledError):
-                logger.debug("Server stopped.")
-                break
-            except KeyboardInterrupt:
-                logger.debug("Server stopped.")
-                break
+                logger.debug("About to handle request...")
+                await self.handle_request(identity, message, received_at)
             except Exception as e:
                 logger.exception(e)
-                continue
-
-            logger.debug("About to handle request...")
-            await self.handle_request(identity, message)
+            finally:
+                self.pending.task_done()
 
     def stop(self):
         self.frontend.close()
         self.context.term()
         self.running = False
 
+    def drain(self):
+        """Stop once no request arrived for `drain_idle` seconds and all are answered."""
+        logger.info("Draining server...")
+        self.draining = True
+
     def _generate_uuid(self):
         return uuid.uuid4().hex
     
-    async def handle_request(self, identity: str, message: bytes):
+    @staticmethod
+    def _expired(request, received_at: float = None) -> bool:
+        deadline = request.deadline
+        if request.timeout is not None and received_at is not None:
+            deadline = min(deadline or float("inf"), received_at + request.timeout)
+        return deadline is not None and time.time() > deadline
+
+    async def reject_request(self, identity: str, message: bytes, status, reason: str):
+        """Answer a request without running it."""
+        logger.warning(f"Rejecting request as {status}: {reason}")
+        self.shed[status] += 1
+
+        response = rejection(self.protocol, message, status, status.capitalize(), reason)
+        await self.send_response(identity, response)
+
+    async def send_response(self, identity: str, response):
+        await self.frontend.send_multipart([identity, b"", encode_response(response)])
+
+    async def handle_request(
+        self, identity: str, message: bytes, received_at: float = None
+    ):
         logger.debug(f"Received request: {message}")
         if identity not in self.clients:
             self.clients[identity] = {
@@ -109,11 +248,17 @@ class SimpleRequestServer:
 
         self.clients[identity]["transactions"].append((request, response))
         self.clients[identity]["transaction_uuids"].append(request.id)
-        
+
+        if self._expired(request, received_at):
+            response.set_status("expired")
+            response.add_error("Expired", "Deadline passed before the request ran")
+            self.shed["expired"] += 1
+            await self.send_response(identity, response)
+            return
 
         unhandled = True
         if request.entity is not None:
-            self.handle_entity_workflow(request, response)
+            await self.handle_entity_workflow(request, response)
             unhandled = False
 
         if unhandled:
@@ -123,18 +268,10 @@ class SimpleRequestServer:
             "completed" if len(response.errors) == 0 else "finished_with_errors"
         )
 
-        try:
-            logger.debug(f"Response: {response}")
-            response_data = response.model_dump_json().encode()
-        except Exception as e:
-            logger.error(f"Error serializing response: {e}")
-            response.add_error("SerializationError", str(e))
-            response_data = response.model_dump_json().encode()
-
         logger.debug(f"\n\n{request.model_dump_json(indent=2)}\n\nreturned\n\n{response.model_dump_json(indent=2)}\n")
-        await self.frontend.send_multipart([identity, b"", response_data])
+        await self.send_response(identity, response)
 
-    def handle_entity_workflow(self, request, response):
+    async def handle_entity_workflow(self, request, response):
         entity = request.entity
         workflow = request.workflow
         step_options = request.step_options
@@ -148,15 +285,28 @@ class SimpleRequestServer:
             return
 
         try:
-            ctx = self.entity_manager.run_workflow(workflow, step_options, entity)
+            ctx = await self.entity_manager.arun_workflow(
+                workflow, step_options, entity
+            )
         except KeyError as e:
             logger.exception(e)
             response.add_error("KeyError", str(e))
             ctx = {}
+        except DependencyError as e:
+            response.add_error("DependencyError", str(e))
+            ctx = {}
+        except Exception as e:
+            logger.exception(e)
+            response.add_error("TaskError", f"Error running workflow: {e}")
+            ctx = {}
 
         response.ctx = request.ctx
 
         response.set_result(ctx["workflow"]["result"] if "workflow" in ctx else None)
+        if "workflow" in ctx:
+            response.add_info(
+                "executions_saved", str(ctx["workflow"]["executions"]["saved"])
+            )
 
     def handle_service_task(self, request, response):
         service = request.service
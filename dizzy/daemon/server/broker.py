@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+import zmq
+
+logger = logging.getLogger(__name__)
+
+
+def serve_worker(
+    backend: str,
+    protocol_dir=None,
+    max_in_flight: int = 16,
+    max_pending: int = 128,
+    log_level: int = logging.WARNING,
+):
+    """Run a SimpleRequestServer connected to a broker's backend until drained."""
+    from .__main__ import SimpleRequestServer
+
+    logging.basicConfig(
+        level=log_level, format="[%(levelname)s] %(name)s:%(lineno)d: %(message)s"
+    )
+
+    async def serve():
+        server = SimpleRequestServer(
+            protocol_dir=protocol_dir,
+            max_in_flight=max_in_flight,
+            max_pending=max_pending,
+            connect=backend,
+        )
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, server.drain)
+
+        await server.run()
+
+    asyncio.run(serve())
+
+
+class BrokerServer:
+    """Fans requests from a ROUTER frontend out to worker processes over a DEALER backend.
+
+    Each worker process runs its own SimpleRequestServer and DaemonEntityManager.
+    Workers that die are restarted. `stop` drains the topology: the broker stops
+    accepting requests, workers answer everything they were sent and exit, and the
+    broker relays their last responses before closing.
+    """
+
+    def __init__(
+        self,
+        address="*",
+        port=5555,
+        workers: int = 2,
+        backend: str = None,
+        protocol_dir=None,
+        max_in_flight: int = 16,
+        max_pending: int = 128,
+    ):
+        self.n_workers = workers
+        self.protocol_dir = protocol_dir
+        self.max_in_flight = max_in_flight
+        self.max_pending = max_pending
+
+        self.context = zmq.Context()
+        self.frontend = self.context.socket(zmq.ROUTER)
+        self.backend = self.context.socket(zmq.DEALER)
+
+        try:
+            self.frontend.bind(f"tcp://{address}:{port}")
+            if backend is None:
+                backend_port = self.backend.bind_to_random_port("tcp://127.0.0.1")
+                backend = f"tcp://127.0.0.1:{backend_port}"
+            else:
+                self.backend.bind(backend)
+        except zmq.error.ZMQError as e:
+            logger.error(f"Error binding broker {address}:{port} / {backend}: {e}")
+            raise RuntimeError(f"Error binding broker {address}:{port} / {backend}: {e}")
+
+        self.backend_address = backend
+        self.workers: list[multiprocessing.Process] = []
+        self.restarts = 0
+        self.draining = False
+        self.running = False
+
+    def _spawn_worker(self) -> multiprocessing.Process:
+        worker = multiprocessing.get_context("spawn").Process(
+            target=serve_worker,
+            args=(
+                self.backend_address,
+                self.protocol_dir,
+                self.max_in_flight,
+                self.max_pending,
+                logging.getLogger().level,
+            ),
+        )
+        worker.start()
+        logger.debug(f"Started worker {worker.pid} on {self.backend_address}")
+        return worker
+
+    def start_workers(self):
+        self.workers = [self._spawn_worker() for _ in range(self.n_workers)]
+
+    def supervise(self):
+        """Restart every worker that died, unless draining."""
+        if self.draining:
+            return
+
+        for i, worker in enumerate(self.workers):
+            if not worker.is_alive():
+                logger.warning(
+                    f"Worker {worker.pid} died with {worker.exitcode}, restarting."
+                )
+                self.workers[i] = self._spawn_worker()
+                self.restarts += 1
+
+    def _begin_drain(self, poller: zmq.Poller):
+        logger.info("Draining broker...")
+        poller.unregister(self.frontend)
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    def run(self):
+        logger.debug(f"Broker running with {self.n_workers} workers...")
+        self.running = True
+        self.start_workers()
+
+        poller = zmq.Poller()
+        poller.register(self.frontend, zmq.POLLIN)
+        poller.register(self.backend, zmq.POLLIN)
+
+        drain_started = False
+        try:
+            while True:
+                try:
+                    if self.draining and not drain_started:
+                        self._begin_drain(poller)
+                        drain_started = True
+                    if drain_started and not any(w.is_alive() for w in self.workers):
+                        while self.backend.poll(100):
+                            self.frontend.send_multipart(self.backend.recv_multipart())
+                        break
+
+                    events = dict(poller.poll(100))
+                    if self.backend in events:
+                        self.frontend.send_multipart(self.backend.recv_multipart())
+                    if self.frontend in events:
+                        self.backend.send_multipart(self.frontend.recv_multipart())
+
+                    self.supervise()
+                except KeyboardInterrupt:
+                    self.stop()
+        finally:
+            for worker in self.workers:
+                worker.join(1)
+                if worker.is_alive():
+                    worker.kill()
+            self.frontend.close(linger=0)
+            self.backend.close(linger=0)
+            self.context.term()
+            self.running = False
+            logger.debug("Broker stopped.")
+
+    def stop(self):
+        """Drain the workers and stop, safe to call from another thread."""
+        self.draining = True
@@ -0,0 +1,440 @@
+import asyncio
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import json
+import logging
+import signal
+import time
+import uuid
+
+import zmq
+
+from ..abstract_protocol import BaseProtocol, DefaultProtocol
+from .__main__ import SimpleRequestServer, encode_response, rejection
+
+logger = logging.getLogger(__name__)
+
+# Frames exchanged between a WorkerBroker's backend and its RemoteWorkers, the
+# broker's ROUTER prefixes everything it receives with the worker's identity.
+#   worker -> broker: READY <capabilities json> | HEARTBEAT | DISCONNECT
+#                     | REPLY <job> <client> <response>
+#   broker -> worker: HEARTBEAT | REQUEST <job> <client> <request>
+READY = b"READY"
+HEARTBEAT = b"HEARTBEAT"
+DISCONNECT = b"DISCONNECT"
+REQUEST = b"REQUEST"
+REPLY = b"REPLY"
+
+
+@dataclass
+class WorkerNode:
+    """A worker as the broker knows it."""
+
+    identity: bytes
+    entities: dict[str, list[str]]
+    services: list[str]
+    capacity: int
+    expiry: float
+    draining: bool = False
+    jobs: dict[bytes, "Job"] = field(default_factory=dict)
+
+    @property
+    def free(self) -> int:
+        return 0 if self.draining else self.capacity - len(self.jobs)
+
+    def can_run(self, entity: str = None, workflow: str = None) -> bool:
+        # Requests without an entity are answered with an error by any worker.
+        if entity is None:
+            return True
+        if entity not in self.entities:
+            return False
+        return workflow is None or workflow in self.entities[entity]
+
+
+@dataclass
+class Job:
+    id: bytes
+    client: bytes
+    message: bytes
+    entity: str = None
+    workflow: str = None
+
+    @classmethod
+    def from_message(cls, client: bytes, message: bytes) -> "Job":
+        try:
+            body = json.loads(message)
+            entity, workflow = body.get("entity"), body.get("workflow")
+        except (ValueError, AttributeError):
+            entity, workflow = None, None
+        return cls(uuid.uuid4().hex.encode(), client, message, entity, workflow)
+
+
+class WorkerBroker:
+    """Routes client requests to registered RemoteWorkers.
+
+    Workers connect to the backend, register the entities and workflows they have
+    loaded and exchange heartbeats with the broker. A request only goes to a live
+    worker that can run its workflow and has a free slot. Workers that miss
+    `heartbeat_liveness` heartbeats are dropped and their unanswered requests are
+    requeued for the other workers.
+    """
+
+    def __init__(
+        self,
+        address="*",
+        port=5555,
+        worker_address="*",
+        worker_port=5556,
+        protocol: BaseProtocol = DefaultProtocol,
+        heartbeat_interval: float = 1.0,
+        heartbeat_liveness: int = 3,
+        max_pending: int = 128,
+    ):
+        self.protocol = protocol() if isinstance(protocol, type) else protocol
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_liveness = heartbeat_liveness
+        self.max_pending = max_pending
+
+        self.context = zmq.Context()
+        self.frontend = self.context.socket(zmq.ROUTER)
+        self.backend = self.context.socket(zmq.ROUTER)
+        # A restarted worker reconnecting under its old identity takes over.
+        self.backend.setsockopt(zmq.ROUTER_HANDOVER, 1)
+
+        try:
+            self.frontend.bind(f"tcp://{address}:{port}")
+            self.backend.bind(f"tcp://{worker_address}:{worker_port}")
+        except zmq.error.ZMQError as e:
+            logger.error(f"Error binding broker {port} / {worker_port}: {e}")
+            raise RuntimeError(f"Error binding broker {port} / {worker_port}: {e}")
+
+        self.workers: dict[bytes, WorkerNode] = {}
+        self.queue: deque[Job] = deque()
+        self.requeued = 0
+        self.running = False
+
+    @property
+    def expiry(self) -> float:
+        return time.time() + self.heartbeat_interval * self.heartbeat_liveness
+
+    def reply(self, client: bytes, response: bytes):
+        self.frontend.send_multipart([client, b"", response])
+
+    def reject(self, job: Job, status, error: str, reason: str):
+        logger.warning(f"Rejecting job {job.id} as {status}: {reason}")
+        response = rejection(self.protocol, job.message, status, error, reason)
+        self.reply(job.client, encode_response(response))
+
+    def requeue(self, node: WorkerNode):
+        if node.jobs:
+            logger.warning(f"Requeueing {len(node.jobs)} jobs of {node.identity}")
+        for job in reversed(list(node.jobs.values())):
+            self.queue.appendleft(job)
+            self.requeued += 1
+        node.jobs.clear()
+
+    def handle_worker(self, frames: list[bytes]):
+        identity, command, *payload = frames
+        node = self.workers.get(identity)
+
+        if command == READY:
+            if node is not None:
+                self.requeue(node)
+            capabilities = json.loads(payload[0])
+            self.workers[identity] = WorkerNode(
+                identity,
+                entities=capabilities["entities"],
+                services=capabilities["services"],
+                capacity=capabilities["capacity"],
+                expiry=self.expiry,
+            )
+            logger.info(f"Worker {identity} ready with {capabilities['entities']}")
+            return
+
+        if node is None:
+            # The broker restarted or dropped it, the worker has to register again.
+            logger.debug(f"Unknown worker {identity} sent {command}")
+            return
+
+        node.expiry = self.expiry
+        if command == REPLY:
+            job_id, client, response = payload
+            if node.jobs.pop(job_id, None) is not None:
+                self.reply(client, response)
+        elif command == DISCONNECT:
+            logger.info(f"Worker {identity} draining")
+            node.draining = True
+
+    def expects(self, job: Job) -> bool:
+        """Whether a worker that can run the job is expected to (re)register."""
+        return False
+
+    def dispatch(self):
+        waiting = deque()
+        while self.queue:
+            job = self.queue.popleft()
+            capable = [
+                w for w in self.workers.values() if w.can_run(job.entity, job.workflow)
+            ]
+            if not capable and self.expects(job):
+                waiting.append(job)
+                continue
+            if not capable:
+                self.reject(
+                    job,
+                    "error",
+                    "NoWorker",
+                    f"No worker runs workflow {job.workflow} of entity {job.entity}",
+                )
+                continue
+
+            node = max(capable, key=lambda w: w.free)
+            if node.free <= 0:
+                waiting.append(job)
+                continue
+
+            node.jobs[job.id] = job
+            self.backend.send_multipart(
+                [node.identity, REQUEST, job.id, job.client, job.message]
+            )
+        self.queue = waiting
+
+    def purge(self):
+        now = time.time()
+        for identity, node in list(self.workers.items()):
+            if node.expiry < now or (node.draining and not node.jobs):
+                if node.expiry < now:
+                    logger.warning(f"Worker {identity} expired")
+                self.drop(identity)
+
+    def drop(self, identity: bytes):
+        node = self.workers.pop(identity, None)
+        if node is not None:
+            self.requeue(node)
+
+    def maintain(self):
+        """Called on every turn of the loop, before the queue is dispatched."""
+        self.purge()
+
+    def heartbeat(self):
+        for identity in self.workers:
+            self.backend.send_multipart([identity, HEARTBEAT])
+
+    def run(self):
+        logger.debug("Worker broker running...")
+        self.running = True
+
+        poller = zmq.Poller()
+        poller.register(self.frontend, zmq.POLLIN)
+        poller.register(self.backend, zmq.POLLIN)
+
+        next_heartbeat = time.time() + self.heartbeat_interval
+        try:
+            while self.running:
+                try:
+                    events = dict(poller.poll(self.heartbeat_interval * 1000 / 2))
+                except KeyboardInterrupt:
+                    break
+
+                if self.backend in events:
+                    self.handle_worker(self.backend.recv_multipart())
+                if self.frontend in events:
+                    client, _, message = self.frontend.recv_multipart()
+                    job = Job.from_message(client, message)
+                    if len(self.queue) >= self.max_pending:
+                        self.reject(
+                            job, "overloaded", "Overloaded", "Broker overloaded"
+                        )
+                    else:
+                        self.queue.append(job)
+
+                self.maintain()
+                self.dispatch()
+
+                if time.time() >= next_heartbeat:
+                    self.heartbeat()
+                    next_heartbeat = time.time() + self.heartbeat_interval
+        finally:
+            self.frontend.close(linger=0)
+            self.backend.close(linger=0)
+            self.context.term()
+            logger.debug("Worker broker stopped.")
+
+    def stop(self):
+        """Stop the broker, safe to call from another thread."""
+        self.running = False
+
+
+_current_job: ContextVar[bytes] = ContextVar("current_job")
+
+
+class RemoteWorker(SimpleRequestServer):
+    """A SimpleRequestServer that serves a WorkerBroker's requests.
+
+    It registers its loaded entities, workflows and services with the broker,
+    heartbeats while connected and reconnects when the broker goes silent.
+    `drain` tells the broker to stop sending work and exits once it is all done.
+
+    `identity` fixes the worker's socket identity, so the broker recognizes it
+    across restarts, and `entities` restricts the entities it loads and advertises.
+    """
+
+    def __init__(
+        self,
+        connect: str,
+        protocol: BaseProtocol = DefaultProtocol,
+        protocol_dir=None,
+        max_in_flight: int = 16,
+        heartbeat_interval: float = 1.0,
+        heartbeat_liveness: int = 3,
+        identity: str = None,
+        entities: list[str] = None,
+    ):
+        super().__init__(
+            protocol=protocol,
+            protocol_dir=protocol_dir,
+            max_in_flight=max_in_flight,
+            max_pending=max_in_flight,
+            connect=connect,
+            entities=entities,
+        )
+        self.broker_address = connect
+        self.identity = identity
+        if identity is not None:
+            self.frontend.close(linger=0)
+            self.frontend = self.connect()
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_liveness = heartbeat_liveness
+        self.in_flight = 0
+
+    def capabilities(self) -> dict:
+        em = self.entity_manager
+        services = set(em.csm.get_service_names())
+        for entity in em.get_entities():
+            services.update(entity.service_manager.get_service_names())
+
+        return {
+            "entities": {e.name: list(e.workflows) for e in em.get_entities()},
+            "services": sorted(services),
+            "capacity": self.max_in_flight,
+        }
+
+    async def register(self):
+        capabilities = json.dumps(self.capabilities()).encode()
+        await self.frontend.send_multipart([READY, capabilities])
+
+    def connect(self) -> zmq.Socket:
+        socket = self.context.socket(zmq.DEALER)
+        if self.identity is not None:
+            socket.setsockopt(zmq.IDENTITY, self.identity.encode())
+        socket.connect(self.broker_address)
+        return socket
+
+    async def reconnect(self):
+        logger.warning(f"Broker {self.broker_address} unreachable, reconnecting...")
+        self.frontend.close(linger=0)
+        self.frontend = self.connect()
+        await self.register()
+
+    async def run(self):
+        logger.debug(f"Remote worker connecting to {self.broker_address}...")
+
+        self.running = True
+        self.pending = asyncio.Queue()
+        workers = [
+            asyncio.create_task(self._request_worker())
+            for _ in range(self.max_in_flight)
+        ]
+        await self.register()
+
+        last_seen = time.time()
+        next_heartbeat = time.time() + self.heartbeat_interval
+        disconnected = False
+        try:
+            while self.running != False:
+                if self.draining and not disconnected:
+                    await self.frontend.send_multipart([DISCONNECT])
+                    disconnected = True
+                if disconnected and self.in_flight == 0:
+                    break
+
+                if await self.frontend.poll(self.heartbeat_interval * 1000 / 2):
+                    command, *payload = await self.frontend.recv_multipart()
+                    last_seen = time.time()
+                    if command == REQUEST:
+                        job, client, message = payload
+                        self.in_flight += 1
+                        self.pending.put_nowait((client, message, time.time(), job))
+                elif time.time() - last_seen > (
+                    self.heartbeat_interval * self.heartbeat_liveness
+                ):
+                    await self.reconnect()
+                    last_seen = time.time()
+
+                if time.time() >= next_heartbeat:
+                    await self.frontend.send_multipart([HEARTBEAT])
+                    next_heartbeat = time.time() + self.heartbeat_interval
+        except (zmq.error.ZMQError, asyncio.exceptions.CancelledError):
+            logger.debug("Remote worker stopped.")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+            if not self.frontend.closed:
+                self.stop()
+
+    async def _request_worker(self):
+        while True:
+            client, message, received_at, job = await self.pending.get()
+            _current_job.set(job)
+            try:
+                await self.handle_request(client, message, received_at)
+            except Exception as e:
+                logger.exception(e)
+                response = rejection(
+                    self.protocol, message, "error", "ServerError", str(e)
+                )
+                await self.send_response(client, response)
+            finally:
+                self.in_flight -= 1
+                self.pending.task_done()
+
+    async def send_response(self, identity: bytes, response):
+        await self.frontend.send_multipart(
+            [REPLY, _current_job.get(), identity, encode_response(response)]
+        )
+
+
+def serve_remote_worker(
+    connect: str,
+    protocol_dir=None,
+    max_in_flight: int = 16,
+    identity: str = None,
+    entities: list[str] = None,
+    heartbeat_interval: float = 1.0,
+    log_level: int = logging.WARNING,
+):
+    """Run a RemoteWorker until drained, SIGTERM and SIGINT drain it."""
+    logging.basicConfig(
+        level=log_level, format="[%(levelname)s] %(name)s:%(lineno)d: %(message)s"
+    )
+
+    async def serve():
+        worker = RemoteWorker(
+            connect,
+            protocol_dir=protocol_dir,
+            max_in_flight=max_in_flight,
+            heartbeat_interval=heartbeat_interval,
+            identity=identity,
+            entities=entities,
+        )
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.drain)
+
+        await worker.run()
+
+    asyncio.run(serve())
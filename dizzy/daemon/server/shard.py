@@ -0,0 +1,147 @@
+from bisect import bisect
+import hashlib
+import logging
+import multiprocessing
+
+from .remote import Job, WorkerBroker, serve_remote_worker
+
+logger = logging.getLogger(__name__)
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes.
+
+    Each node is placed on the ring `replicas` times, so adding or removing a node
+    only moves the keys of its neighbours.
+    """
+
+    def __init__(self, nodes: list[str], replicas: int = 64):
+        self.nodes = list(nodes)
+        self.ring = sorted(
+            (self._hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self.points = [point for point, _ in self.ring]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def node_for(self, key: str) -> str:
+        if not self.ring:
+            raise ValueError("Empty hash ring")
+        i = bisect(self.points, self._hash(key)) % len(self.ring)
+        return self.ring[i][1]
+
+
+def partition(
+    entities: list[str], shards: dict[str, list[str]] = None, workers: int = 0
+) -> dict[str, list[str]]:
+    """Assign every entity to a shard.
+
+    Entities pinned in `shards` stay on their shard, hot entities can get one of
+    their own. The rest are hashed onto `workers` extra shards, or onto the
+    configured ones when there are none.
+    """
+    shards = shards or {}
+    assigned = {name: [e for e in es if e in entities] for name, es in shards.items()}
+    pinned = {e for es in shards.values() for e in es}
+
+    ring_nodes = [f"shard-{i}" for i in range(workers)] or list(shards)
+    rest = [e for e in entities if e not in pinned]
+    if rest and not ring_nodes:
+        raise ValueError("No shard to place unpinned entities on")
+
+    ring = HashRing(ring_nodes)
+    for node in ring_nodes:
+        assigned.setdefault(node, [])
+    for entity in rest:
+        assigned[ring.node_for(entity)].append(entity)
+
+    return {name: es for name, es in assigned.items() if es}
+
+
+class ShardedBroker(WorkerBroker):
+    """A WorkerBroker over local worker processes that each load one shard.
+
+    The default entities are partitioned with `partition`, every shard's process
+    loads the common services and only its own entities, and requests are routed
+    to the shard that owns their entity. Dead shard processes are restarted and
+    their requests wait for the restart. `stop` drains the shards first.
+    """
+
+    def __init__(
+        self,
+        entities: list[str],
+        shards: dict[str, list[str]] = None,
+        workers: int = 0,
+        address="*",
+        port=5555,
+        worker_port=5556,
+        protocol_dir=None,
+        max_in_flight: int = 16,
+        **kwargs,
+    ):
+        super().__init__(address, port, "127.0.0.1", worker_port, **kwargs)
+        self.shards = partition(entities, shards, workers)
+        self.owners = {e: shard for shard, es in self.shards.items() for e in es}
+        self.worker_address = f"tcp://127.0.0.1:{worker_port}"
+        self.protocol_dir = protocol_dir
+        self.max_in_flight = max_in_flight
+
+        self.processes: dict[str, multiprocessing.Process] = {}
+        self.restarts = 0
+        self.draining = False
+
+    def _spawn(self, shard: str) -> multiprocessing.Process:
+        process = multiprocessing.get_context("spawn").Process(
+            target=serve_remote_worker,
+            args=(self.worker_address, self.protocol_dir, self.max_in_flight),
+            kwargs={
+                "identity": shard,
+                "entities": self.shards[shard],
+                "heartbeat_interval": self.heartbeat_interval,
+                "log_level": logging.getLogger().level,
+            },
+        )
+        process.start()
+        logger.debug(f"Started shard {shard} ({process.pid}): {self.shards[shard]}")
+        return process
+
+    def expects(self, job: Job) -> bool:
+        return not self.draining and job.entity in self.owners
+
+    def maintain(self):
+        if self.draining:
+            if not any(p.is_alive() for p in self.processes.values()):
+                self.running = False
+        else:
+            for shard, process in self.processes.items():
+                if not process.is_alive():
+                    logger.warning(
+                        f"Shard {shard} died with {process.exitcode}, restarting."
+                    )
+                    self.drop(shard.encode())
+                    self.processes[shard] = self._spawn(shard)
+                    self.restarts += 1
+        super().maintain()
+
+    def run(self):
+        logger.debug(f"Sharded broker running with {self.shards}...")
+        self.processes = {shard: self._spawn(shard) for shard in self.shards}
+        try:
+            super().run()
+        finally:
+            for process in self.processes.values():
+                process.join(1)
+                if process.is_alive():
+                    process.kill()
+
+    def stop(self):
+        """Drain the shards and stop, safe to call from another thread."""
+        logger.info("Draining shards...")
+        self.draining = True
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
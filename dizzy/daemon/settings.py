@@ -1,11 +1,12 @@
 import importlib
 import os
 from pathlib import Path
-from dataclasses import dataclass, fields
+from dataclasses import dataclass, field, fields
 import shutil
-import yaml
 import logging
 
+from ..utils import list_dir, load_yaml
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,6 +17,10 @@ class Settings:
     all_entities: dict
     common_services: dict
     default_entities: dict
+    executor: dict = field(default_factory=dict)
+    shards: dict = field(default_factory=dict)
+    lazy_tasks: bool = False
+    load_workers: int = 0
 
 
 @dataclass
@@ -46,6 +51,10 @@ class SettingsManager:
     ):
         self.live_reload = live_reload
 
+        # The singleton keeps the data root it was first given unless a new one is.
+        if not data_root and hasattr(self, "data_root"):
+            data_root = self.data_root
+
         # Get from DIZZY_DATA_ROOT, ~/.dizzy, or packaged default_data if not provided
         # home_root = Path("~/.dizzy")
         # packaged_root = Path(__file__).parent.parent / "default_data"
@@ -89,6 +98,8 @@ class SettingsManager:
         #         else home_root if home_root.exists() else packaged_root
         #     )
         # simply get it from data_root, env_var, or packaged default_data
+        if getattr(self, "data_root", None) != data_root:
+            self._loaded = False
         self.data_root = data_root
 
         # inject settings into the global namespace for Tasks to use after Daemon initialization
@@ -118,35 +129,27 @@ class SettingsManager:
         if not entities_dir.exists():
             raise FileNotFoundError(f"Entities directory not found at {entities_dir}.")
 
-        with open(daemon_settings_file, "r") as f:
-            settings_from_yaml = yaml.safe_load(f)["settings"]
-            default_common_services = settings_from_yaml["common_services"]
-            default_entities = settings_from_yaml["entities"]
-
-            _all_common_service_files = [
-                common_service_dir / s / "service.yml"
-                for s in common_service_dir.iterdir()
-                if s.is_dir()
-            ]
-
-            _all_entity_files = [
-                entities_dir / e / "entity.yml"
-                for e in entities_dir.iterdir()
-                if e.is_dir()
-            ]
+        settings_from_yaml = load_yaml(daemon_settings_file)["settings"]
+        default_common_services = settings_from_yaml["common_services"]
+        default_entities = settings_from_yaml["entities"]
+        executor = settings_from_yaml.get("executor", {})
+        shards = settings_from_yaml.get("shards") or {}
+        lazy_tasks = settings_from_yaml.get("lazy_tasks", False)
+        load_workers = settings_from_yaml.get("load_workers", 0)
 
         all_common_services = {
-            s.name: f
-            for s, f in zip(common_service_dir.iterdir(), _all_common_service_files)
+            s.name: s / "service.yml"
+            for s, is_dir in list_dir(common_service_dir)
+            if is_dir
         }
         common_services = {
             s: f for s, f in all_common_services.items() if s in default_common_services
         }
 
         all_entities = {
-            e.name: f
-            for e, f in zip(entities_dir.iterdir(), _all_entity_files)
-            if (e / "entity.yml").exists()
+            e.name: e / "entity.yml"
+            for e, is_dir in list_dir(entities_dir)
+            if is_dir and (e / "entity.yml").exists()
         }
         default_entities = {
             e: f for e, f in all_entities.items() if e in default_entities
@@ -158,6 +161,10 @@ class SettingsManager:
             all_entities,
             common_services,
             default_entities,
+            executor,
+            shards,
+            lazy_tasks,
+            load_workers,
         )
 
         self._meta = MetaSettings(entities_dir, common_service_dir)
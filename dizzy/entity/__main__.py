@@ -6,7 +6,8 @@ from typing import Optional
 import yaml
 
 from ..service import ServiceManager
-from ..utils import ActionDataclassMixin
+from ..utils import ActionDataclassMixin, DependencyError, list_dir, load_yaml
+from ..workflow import ExecutionContext, WorkflowPlan
 
 logger = logging.getLogger(__name__)
 
@@ -26,27 +27,76 @@ class Entity(ActionDataclassMixin):
     def __post_init__(self):
         self.__services_root = None
         self.__service_manager = None
+        self.__workflow_plans: dict[str, WorkflowPlan] = {}
 
     @staticmethod
-    def load_from_yaml(entity: Path) -> "Entity":
-        with open(entity) as f:
-            logger.debug(f"Loading entity from {entity}")
-            E = Entity(**yaml.safe_load(f)["entity"])
-            E.__services_root = entity.parent / "services"
-
-            E.service_manager.load_services(E.get_service_files())
-
-            # All tasks need to register any actions the Entity offers
-            for service in E.service_manager.services.values():
-                for task in service.get_tasks():
-                    if hasattr(task, "requested_actions"):
-                        for action in task.requested_actions:
-                            a = E.get_action(action)
-                            if callable(a[1]):
-                                task.register_action(action, *a)
-
-            logger.debug(f"Loaded entity {E.name}")
-            return E
+    def load_from_yaml(
+        entity: Path, common_services: Optional[ServiceManager] = None
+    ) -> "Entity":
+        logger.debug(f"Loading entity from {entity}")
+        E = Entity(**load_yaml(entity)["entity"])
+        E.__services_root = entity.parent / "services"
+
+        if common_services is not None:
+            E.service_manager.lazy = common_services.lazy
+        E.service_manager.load_services(E.get_service_files())
+        if common_services is not None:
+            E.add_common_services(common_services)
+
+        # All tasks need to register any actions the Entity offers
+        for service in E.service_manager.services.values():
+            for task in service.get_tasks():
+                if hasattr(task, "requested_actions"):
+                    for action in task.requested_actions:
+                        a = E.get_action(action)
+                        if callable(a[1]):
+                            task.register_action(action, *a)
+
+        E.compile_workflows()
+
+        logger.debug(f"Loaded entity {E.name}")
+        return E
+
+    def add_common_services(self, common_services: ServiceManager):
+        """Share the common services this entity uses with its own service manager."""
+        for service in self.services:
+            if service in common_services.services:
+                logger.debug(f"Copying service {service} to {self.name}")
+                self.service_manager.add_service(common_services.services[service])
+
+        self.service_manager.compile_plans()
+
+    def missing_services(self) -> list[str]:
+        if self.services == ["*"]:
+            return []
+        return [s for s in self.services if s not in self.service_manager.services]
+
+    def compile_workflows(self):
+        """Compile every workflow into a WorkflowPlan.
+
+        A step that no loaded service provides raises a DependencyError, unless the
+        entity is still missing some of its services, in which case the workflow is
+        left uncompiled until it is first run.
+        """
+        plans = {}
+        for name, spec in self.workflows.items():
+            try:
+                plans[name] = WorkflowPlan.compile(name, spec, self.service_manager)
+            except DependencyError as e:
+                missing = self.missing_services()
+                if not missing:
+                    raise
+                logger.warning(f"{e} Deferring, {self.name} is missing {missing}.")
+
+        self.__workflow_plans = plans
+
+    def get_workflow_plan(self, workflow: str) -> WorkflowPlan:
+        if workflow not in self.__workflow_plans:
+            spec = self.workflows[workflow]
+            self.__workflow_plans[workflow] = WorkflowPlan.compile(
+                workflow, spec, self.service_manager
+            )
+        return self.__workflow_plans[workflow]
 
     def save_to_yaml(self, entity: Path = None):
         if entity is None:
@@ -69,12 +119,7 @@ class Entity(ActionDataclassMixin):
         if self.__services_root is None:
             raise ValueError("No services root set")
 
-        service_files = self.__services_root.glob(f"**/*.yml")
-        service_files = [
-            f
-            for f in service_files
-            if f.parent.name in self.services or self.services == ["*"]
-        ]
+        service_files = self.find_service_files(self.__services_root, self.services)
 
         logger.debug(
             f"Found {self.name} service files {service_files} in {self.__services_root}"
@@ -82,31 +127,72 @@ class Entity(ActionDataclassMixin):
 
         return service_files
 
+    @staticmethod
+    def find_service_files(services_root: Path, services: list[str]) -> list[Path]:
+        return [
+            f
+            for f, is_dir in list_dir(services_root, recursive=True)
+            if not is_dir
+            and f.suffix == ".yml"
+            and (f.parent.name in services or services == ["*"])
+        ]
+
+    def _workflow_steps(self, plan: WorkflowPlan, step_options: dict, ctx: dict):
+        """Yield each step's task, tasklist and args, passing on the previous result."""
+        for i, (task, tasklist) in enumerate(zip(plan.steps, plan.plans)):
+            if i > 0 and plan.steps[i - 1] in ctx["workflow"]["result"]:
+                ctx["workflow"]["input"][task] = ctx["workflow"]["result"][
+                    plan.steps[i - 1]
+                ]
+
+            if step_options is not None and task in step_options:
+                args = step_options[task]
+            else:
+                logger.warning(f"No step options for {task}, passing empty args")
+                args = None
+
+            yield task, tasklist, args
+
     def run_workflow(
         self,
         workflow: str,
         step_options: Optional[dict[dict]] = None,
     ):
-        """A workflow is a set of non-dependent tasks made dependent by the workflow."""
+        """A workflow is a set of non-dependent tasks made dependent by the workflow.
+
+        Every task runs at most once per workflow run unless it is itself a step,
+        ctx["workflow"]["executions"] counts the executions this saved.
+        """
         logger.debug(f"Running workflow {workflow} for entity {self.name}")
 
         ctx = {"workflow": {"input": {}, "result": {}}}
-        # parse workflow
-        wf = self.workflows[workflow]
-        tasks = wf.replace(" ", "").split("->")
+        plan = self.get_workflow_plan(workflow)
+        execution = ExecutionContext()
 
-        for i, task in enumerate(tasks):
-            if tasks[i - 1] in ctx["workflow"]["result"]:
-                ctx["workflow"]["input"][task] = ctx["workflow"]["result"][tasks[i - 1]]
+        for task, tasklist, args in self._workflow_steps(plan, step_options, ctx):
+            ctx["workflow"]["result"][task] = self.service_manager.run_tasklist(
+                tasklist, args=args, ctx=ctx, execution=execution
+            )
 
-            if step_options is not None and task in step_options:
-                args = step_options[task]
-            else:
-                logger.warning(f"No step options for {task}, passing empty args")
-                args = None
+        ctx["workflow"]["executions"] = execution.stats()
+        return ctx
+
+    async def arun_workflow(
+        self,
+        workflow: str,
+        step_options: Optional[dict[dict]] = None,
+    ):
+        """Run a workflow on the running event loop, see `run_workflow`."""
+        logger.debug(f"Running workflow {workflow} for entity {self.name}")
+
+        ctx = {"workflow": {"input": {}, "result": {}}}
+        plan = self.get_workflow_plan(workflow)
+        execution = ExecutionContext()
 
-            ctx["workflow"]["result"][task] = self.service_manager.run_task(
-                task, args=args, ctx=ctx
+        for task, tasklist, args in self._workflow_steps(plan, step_options, ctx):
+            ctx["workflow"]["result"][task] = await self.service_manager.arun_tasklist(
+                tasklist, args=args, ctx=ctx, execution=execution
             )
 
+        ctx["workflow"]["executions"] = execution.stats()
         return ctx
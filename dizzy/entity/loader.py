@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import logging
+from pathlib import Path
+import time
+
+from . import Entity
+from ..service.lazy import scan_tasks
+from ..utils import list_dir, load_module, load_yaml
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LoadReport:
+    """Wall time spent in each phase of loading a data root, and what was loaded."""
+
+    workers: int = 0
+    phases: dict[str, float] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+
+    @contextmanager
+    def timed(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = (
+                self.phases.get(phase, 0.0) + time.perf_counter() - start
+            )
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def __str__(self):
+        counts = ", ".join(f"{n} {what}" for what, n in self.counts.items())
+        phases = ", ".join(f"{p} {t:.3f}s" for p, t in self.phases.items())
+        return f"Loaded {counts} in {self.total:.3f}s ({phases})"
+
+
+def _quietly(load, path: Path):
+    # Errors surface again when the managers load the same file, in order.
+    try:
+        load(path)
+    except Exception as e:
+        logger.debug(f"Preloading {path} failed: {e}")
+
+
+def _entity_service_files(entity: Path) -> list[Path]:
+    try:
+        services = load_yaml(entity)["entity"]["services"]
+    except Exception:
+        return []
+    return Entity.find_service_files(entity.parent / "services", services)
+
+
+def _task_modules(service: Path) -> list[Path]:
+    try:
+        listing = list_dir(service.parent / "tasks")
+    except FileNotFoundError:
+        return []
+    return [m for m, is_dir in listing if not is_dir and m.suffix == ".py"]
+
+
+def preload(
+    services: list[Path],
+    entities: list[Path],
+    workers: int,
+    lazy: bool = False,
+    report: LoadReport = None,
+) -> LoadReport:
+    """Discover, parse and import a data root's files in a thread pool.
+
+    Parsed documents and modules are cached per process, so the managers loading
+    the same files afterwards only build and register, in a deterministic order.
+    """
+    report = report or LoadReport(workers)
+    services, entities = list(services), list(entities)
+
+    with ThreadPoolExecutor(workers, thread_name_prefix="dizzy-load") as pool:
+        with report.timed("parse"):
+            list(pool.map(_quietly, [load_yaml] * len(entities), entities))
+
+        with report.timed("discover"):
+            for files in pool.map(_entity_service_files, entities):
+                services.extend(files)
+
+        with report.timed("parse"):
+            list(pool.map(_quietly, [load_yaml] * len(services), services))
+
+        with report.timed("discover"):
+            modules = [m for ms in pool.map(_task_modules, services) for m in ms]
+            modules = list(dict.fromkeys(modules))
+
+        load = scan_tasks if lazy else load_module
+        with report.timed("scan" if lazy else "import"):
+            list(pool.map(_quietly, [load] * len(modules), modules))
+
+    report.counts.update(
+        entities=len(entities), services=len(services), modules=len(modules)
+    )
+    return report
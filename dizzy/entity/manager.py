@@ -3,18 +3,26 @@ from pathlib import Path
 from typing import Optional
 
 from . import Entity
-from ..service import ServiceManager
+from .loader import LoadReport, preload
+from ..service import Service, ServiceManager, TaskExecutor
+from ..task import Task
 from ..utils import ActionDataclassMixin
 
 logger = logging.getLogger(__name__)
 
 
 class EntityManager(ActionDataclassMixin):
-    def __init__(self, service_manager: ServiceManager = None):
+    def __init__(
+        self, service_manager: ServiceManager = None, executor: TaskExecutor = None
+    ):
         super(ActionDataclassMixin, self).__init__()
 
         self.entities = {}
-        self.__common_service_manager = service_manager or ServiceManager()
+        self.load_report = None
+        self._clear_indexes()
+        self.__common_service_manager = service_manager or ServiceManager(executor)
+        if executor is not None:
+            self.__common_service_manager.executor = executor
 
         logger.debug(f"Created new entity manager {self}")
 
@@ -23,6 +31,17 @@ class EntityManager(ActionDataclassMixin):
     def __post_init__(self):
         self.register_action("entity_info", "", self.get_entities)
 
+    @property
+    def executor(self) -> TaskExecutor:
+        """The executor shared by the common services and every entity."""
+        return self.common_service_manager.executor
+
+    @executor.setter
+    def executor(self, executor: TaskExecutor):
+        self.common_service_manager.executor = executor
+        for entity in self.entities.values():
+            entity.service_manager.executor = executor
+
     @property
     def csm(self) -> ServiceManager:
         return self.common_service_manager
@@ -36,9 +55,47 @@ class EntityManager(ActionDataclassMixin):
 
     def reset(self):
         self.entities = {}
+        self._clear_indexes()
         self.common_service_manager.reset()
 
-    def load(self, services: dict, entities: dict):
+    def _clear_indexes(self):
+        # Name -> first owner in entity load order, what a scan would find first.
+        self.__tasks: dict[str, tuple[Entity, Service, Task]] = {}
+        self.__services: dict[str, list[str]] = {}
+        self.__workflows: dict[str, Entity] = {}
+
+    def _index_entity(self, entity: Entity):
+        for workflow in entity.workflows:
+            self.__workflows.setdefault(workflow, entity)
+        for service in entity.service_manager.services.values():
+            self.__services.setdefault(service.name, []).append(entity.name)
+            for task in service.get_tasks():
+                self.__tasks.setdefault(task.name, (entity, service, task))
+
+    def reindex(self):
+        """Rebuild the task, service and workflow indexes from the loaded entities."""
+        self._clear_indexes()
+        for entity in self.entities.values():
+            self._index_entity(entity)
+
+    def load(self, services: dict, entities: dict, workers: int = 0) -> LoadReport:
+        """Load the common services then the entities, returning a LoadReport.
+
+        With `workers`, their files are first discovered, parsed and imported in
+        a thread pool of that size, see `preload`.
+        """
+        report = LoadReport(workers)
+        if workers:
+            preload(services.values(), entities.values(), workers, self.csm.lazy, report)
+
+        with report.timed("register"):
+            self._load(services, entities)
+
+        self.load_report = report
+        logger.info(str(report))
+        return report
+
+    def _load(self, services: dict, entities: dict):
         self.csm.load_services(services.values())
         # now register actions for the common service manager's tasks
         # TODO: all location of tasks need to check common services too.
@@ -52,14 +109,6 @@ class EntityManager(ActionDataclassMixin):
 
         self.load_entities(entities.values())
 
-    def _copy_common_services(self, entity: Entity):
-        for service in entity.services:
-            if service in self.common_service_manager.services:
-                logger.debug(f"Copying service {service} to {entity.name}")
-                entity.service_manager.services[service] = (
-                    self.common_service_manager.services[service]
-                )
-
     def _register_task_actions(self, entity: Entity):
         for service in entity.service_manager.services.values():
             for task in service.get_tasks():
@@ -70,12 +119,19 @@ class EntityManager(ActionDataclassMixin):
                             task.register_action(action, *a)
 
     def load_entities(self, entity_paths: list[Path]):
+        reloaded = False
         for entity in entity_paths:
-            E = Entity.load_from_yaml(entity)
+            E = Entity.load_from_yaml(entity, self.common_service_manager)
+            E.service_manager.executor = self.executor
+            reloaded |= E.name in self.entities
             self.entities[E.name] = E
 
-            self._copy_common_services(E)
             self._register_task_actions(E)
+            if not reloaded:
+                self._index_entity(E)
+
+        if reloaded:
+            self.reindex()
 
         logger.debug(f"Loaded entities {self.entities.keys()}")
 
@@ -87,19 +143,33 @@ class EntityManager(ActionDataclassMixin):
 
         return workflows
 
+    def find_workflow_entity(
+        self, workflow: str, entity_name: str = None
+    ) -> Optional[Entity]:
+        if entity_name in self.entities:
+            return self.get_entity(entity_name)
+
+        logger.info(
+            f"Entity={entity_name} not found. Searching for {workflow} in all entities."
+        )
+        if workflow in self.__workflows:
+            return self.__workflows[workflow]
+        logger.warning(f"Workflow={workflow} not found in any entity.")
+        return None
+
     def run_workflow(
         self, workflow: str, step_options: dict = None, entity_name: str = None
     ):
-        if entity_name in self.entities:
-            return self.get_entity(entity_name).run_workflow(workflow, step_options)
-        else:
-            logger.info(
-                f"Entity={entity_name} not found. Searching for {workflow} in all entities."
-            )
-            for e, wf in self.get_workflows():
-                if wf == workflow:
-                    return self.get_entity(e).run_workflow(workflow, step_options)
-            logger.warning(f"Workflow={workflow} not found in any entity.")
+        entity = self.find_workflow_entity(workflow, entity_name)
+        if entity is not None:
+            return entity.run_workflow(workflow, step_options)
+
+    async def arun_workflow(
+        self, workflow: str, step_options: dict = None, entity_name: str = None
+    ):
+        entity = self.find_workflow_entity(workflow, entity_name)
+        if entity is not None:
+            return await entity.arun_workflow(workflow, step_options)
 
     def get_entity(self, entity: str) -> Optional[Entity]:
         if entity in self.entities:
@@ -108,37 +178,35 @@ class EntityManager(ActionDataclassMixin):
             logger.warning(f"Entity {entity} not found.")
             return None
 
-    def find_task(self, task: str) -> Optional[tuple[str, str]]:
-        for entity in self.entities.values():
-            for service in entity.service_manager.services.values():
-                if task in service.tasks:
-                    return service.get_task(task)
+    def find_task(self, task: str) -> Optional[Task]:
+        if task in self.__tasks:
+            return self.__tasks[task][1].get_task(task)
 
         logger.warning(f"Task={task} not found in any entity.")
         return None
 
-    def find_service(self, service: str) -> Optional[tuple[str, str]]:
-        for entity in self.entities.values():
-            if service in entity.service_manager.services:
-                return entity.service_manager.get_service(service)
+    def find_service(self, service: str) -> Optional[Service]:
+        if service in self.__services:
+            entity = self.entities[self.__services[service][0]]
+            return entity.service_manager.get_service(service)
 
         logger.warning(f"Service={service} not found in any entity.")
         return None
 
+    def find_service_entities(self, service: str) -> list[str]:
+        """Names of every entity whose service manager has the service."""
+        return list(self.__services.get(service, []))
+
     def find_owner_entity(self, task: str) -> Optional[Entity]:
-        for entity in self.entities.values():
-            for service in entity.service_manager.services.values():
-                if task in service.tasks:
-                    return entity
+        if task in self.__tasks:
+            return self.__tasks[task][0]
 
         logger.warning(f"Owner entity for task={task} not found in any entity.")
         return None
 
-    def find_owner_service(self, task: str) -> Optional[tuple[str, str]]:
-        for entity in self.entities.values():
-            for service in entity.service_manager.services.values():
-                if task in service.tasks:
-                    return entity.service_manager.get_service(service)
+    def find_owner_service(self, task: str) -> Optional[Service]:
+        if task in self.__tasks:
+            return self.__tasks[task][1]
 
         logger.warning(f"Owner service for task={task} not found in any entity.")
         return None
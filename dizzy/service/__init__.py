@@ -1,7 +1,9 @@
 from .__main__ import Service
+from .executor import TaskExecutor
 from .manager import ServiceManager
 
 __all__ = [
     "Service",
     "ServiceManager",
+    "TaskExecutor",
 ]
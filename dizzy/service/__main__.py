@@ -1,4 +1,6 @@
+import inspect
 from pathlib import Path
+import threading
 from typing import Optional
 
 import yaml
@@ -10,8 +12,9 @@ from dataclasses import asdict, dataclass, field
 logger = logging.getLogger(__name__)
 
 
-from ..utils import load_module, ActionDataclassMixin
+from ..utils import list_dir, load_module, load_yaml, ActionDataclassMixin
 from ..task import Task
+from .lazy import LazyTask, scan_tasks
 
 
 @dataclass
@@ -24,54 +27,83 @@ class Service(ActionDataclassMixin):
     def __post_init__(self):
         self.__task_root = None
         self.__loaded_tasks = {}
-
-    def _load_tasks(self):
-        for task in Path(self.__task_root).glob("*.py"):
-            module = load_module(task)
-            for name, obj in module.__dict__.items():
-                if (
-                    isinstance(obj, type)
-                    and issubclass(obj, Task)
-                    and name in self.tasks
-                    or self.tasks == ["*"]
-                ):
-                    logger.debug(f"[{self.name}] Loading task {name} from {task}")
-                    obj.name = obj.__name__
-                    obj.description = obj.__doc__
-
-                    # This really isn't great, basically when we instantiate a Task, it loses it's default lists.
-                    dependencies = None
-                    if hasattr(obj, "dependencies"):
-                        dependencies = obj.dependencies.copy()
-                    requested_actions = None
-                    if hasattr(obj, "requested_actions"):
-                        requested_actions = obj.requested_actions.copy()
-
-                    obj = obj()
-
-                    if dependencies is not None:
-                        setattr(obj, "dependencies", dependencies)
-                    if requested_actions is not None:
-                        setattr(obj, "requested_actions", requested_actions)
-
-                    if hasattr(obj, "requested_actions"):
-                        for action in obj.requested_actions:
-                            a = self.get_action(action)
-                            if callable(a[1]):
-                                obj.register_action(action, *a)
-
-                    self.__loaded_tasks[name] = obj
+        self.__import_lock = threading.Lock()
+
+    def _wants(self, name: str) -> bool:
+        return name in self.tasks or self.tasks == ["*"]
+
+    def _load_tasks(self, lazy: bool = False):
+        """Load the tasks named in `tasks`, `lazy` only scans the task modules.
+
+        Lazily loaded tasks are LazyTasks until a `get_task` or their first run
+        imports their module. Modules the scan can't describe are imported at once.
+        """
+        for task, is_dir in list_dir(Path(self.__task_root)):
+            if is_dir or task.suffix != ".py":
+                continue
+            if lazy:
+                specs = {n: s for n, s in scan_tasks(task).items() if self._wants(n)}
+                if all(spec is not None for spec in specs.values()):
+                    for name, spec in specs.items():
+                        logger.debug(f"[{self.name}] Found task {name} in {task}")
+                        self.__loaded_tasks[name] = LazyTask(spec, self.get_task)
+                    continue
+
+            self._import_tasks(task)
+
+    def _import_tasks(self, task: Path):
+        module = load_module(task)
+        for name, obj in module.__dict__.items():
+            if (
+                isinstance(obj, type)
+                and issubclass(obj, Task)
+                and name in self.tasks
+                or self.tasks == ["*"]
+            ):
+                logger.debug(f"[{self.name}] Loading task {name} from {task}")
+                obj.name = obj.__name__
+                obj.description = obj.__doc__
+                obj.source = str(task)
+                obj.is_async = inspect.iscoroutinefunction(obj.run)
+
+                # This really isn't great, basically when we instantiate a Task, it loses it's default lists.
+                dependencies = None
+                if hasattr(obj, "dependencies"):
+                    dependencies = obj.dependencies.copy()
+                requested_actions = None
+                if hasattr(obj, "requested_actions"):
+                    requested_actions = obj.requested_actions.copy()
+
+                obj = obj()
+
+                if dependencies is not None:
+                    setattr(obj, "dependencies", dependencies)
+                if requested_actions is not None:
+                    setattr(obj, "requested_actions", requested_actions)
+
+                if hasattr(obj, "requested_actions"):
+                    for action in obj.requested_actions:
+                        a = self.get_action(action)
+                        if callable(a[1]):
+                            obj.register_action(action, *a)
+
+                # Actions registered while it was lazy carry over.
+                lazy = self.__loaded_tasks.get(name)
+                if isinstance(lazy, LazyTask):
+                    for action, (argstr, fn) in lazy.registered_actions.items():
+                        obj.register_action(action, argstr, fn)
+
+                self.__loaded_tasks[name] = obj
 
     @staticmethod
-    def load_from_yaml(service: Path) -> "Service":
-        with open(service) as f:
-            logger.debug(f"Loading service from {service}")
-            S = Service(**yaml.safe_load(f)["service"])
-            S.__task_root = str(service.parent / "tasks")
-            S._load_tasks()
+    def load_from_yaml(service: Path, lazy: bool = False) -> "Service":
+        logger.debug(f"Loading service from {service}")
+        S = Service(**load_yaml(service)["service"])
+        S.__task_root = str(service.parent / "tasks")
+        S._load_tasks(lazy)
 
-            logger.debug(f"Loaded service {S.name} with tasks {S.tasks}")
-            return S
+        logger.debug(f"Loaded service {S.name} with tasks {S.tasks}")
+        return S
 
     def save_to_yaml(self, service: Path = None):
         if service is None:
@@ -84,13 +116,21 @@ class Service(ActionDataclassMixin):
         with open(service, "w") as f:
             yaml.safe_dump({"service": asdict(self)}, f)
 
-    def get_task(self, name: str) -> Task:
+    def get_task(self, name: str, load: bool = True) -> Task:
+        """Get a loaded task, importing it first if it is lazy unless `load` is False."""
         if name not in self.__loaded_tasks:
             logger.error(f"Task {name} not loaded")
             if name in self.tasks:
                 raise ValueError(f"Task {name} not loaded")
             raise KeyError(f"Task {name} not found in service {self.name}")
-        return self.__loaded_tasks[name]
+
+        task = self.__loaded_tasks[name]
+        if load and isinstance(task, LazyTask):
+            with self.__import_lock:
+                if isinstance(self.__loaded_tasks[name], LazyTask):
+                    self._import_tasks(Path(task.source))
+            task = self.__loaded_tasks[name]
+        return task
 
     def get_tasks(self) -> list[Task]:
         return list(self.__loaded_tasks.values())
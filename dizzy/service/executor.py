@@ -0,0 +1,266 @@
+import asyncio
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+import logging
+import multiprocessing
+from pathlib import Path
+from typing import Any, Literal, Optional
+
+from ..task import Task
+from ..utils import load_module
+from ..workflow.context import ExecutionContext
+
+logger = logging.getLogger(__name__)
+
+Backend = Literal["inline", "thread"]
+
+
+# State of a process pool worker, a task is shipped as its source file and name.
+_worker_modules: dict[str, object] = {}
+_worker_tasks: dict[tuple[str, str], Task] = {}
+
+
+def _init_worker(sources: list[str]):
+    for source in sources:
+        _worker_modules[source] = load_module(Path(source))
+
+
+def _run_in_worker(source: str, name: str, args: dict):
+    if (source, name) not in _worker_tasks:
+        if source not in _worker_modules:
+            _worker_modules[source] = load_module(Path(source))
+        _worker_tasks[(source, name)] = getattr(_worker_modules[source], name)()
+
+    return _call(_worker_tasks[(source, name)], args)
+
+
+def _call(task: Task, args: dict):
+    """Run a task synchronously, driving an async run on its own event loop."""
+    if task.is_async:
+        return asyncio.run(task.run(args))
+    return task.run(args)
+
+
+class TaskExecutor:
+    """Runs a topologically sorted tasklist as a DAG.
+
+    The `inline` backend runs tasks one after another in the calling thread, the
+    `thread` backend starts every task in a thread pool as soon as its dependencies
+    have finished, so independent I/O-bound branches run concurrently.
+
+    Tasks declaring `executor = "process"` run in a pool of worker processes with
+    either backend. Workers are spawned with the task modules registered so far
+    already imported and stay warm between runs. Process tasks cannot run actions.
+
+    `arun` is the event loop equivalent of `run`, it awaits async tasks directly and
+    runs sync tasks in the thread pool, starting each as soon as it is ready.
+    """
+
+    backends = ("inline", "thread")
+
+    def __init__(
+        self,
+        backend: Backend = "inline",
+        max_workers: Optional[int] = None,
+        max_processes: Optional[int] = None,
+    ):
+        if backend not in self.backends:
+            raise ValueError(f"Unknown executor backend {backend}, use {self.backends}")
+
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_processes = max_processes
+        self.sources: set[str] = set()
+        self.__pool = None
+        self.__process_pool = None
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self.__pool is None:
+            self.__pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="dizzy-task"
+            )
+        return self.__pool
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self.__process_pool is None:
+            self.__process_pool = ProcessPoolExecutor(
+                max_workers=self.max_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(sorted(self.sources),),
+            )
+        return self.__process_pool
+
+    def register(self, task: Task):
+        """Preload the module of a process task in workers started from now on."""
+        if task.executor == "process" and task.source is not None:
+            self.sources.add(task.source)
+
+    def shutdown(self):
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=True, cancel_futures=True)
+            self.__pool = None
+        if self.__process_pool is not None:
+            self.__process_pool.shutdown(wait=True, cancel_futures=True)
+            self.__process_pool = None
+
+    def submit(self, task: Task, task_args: dict) -> Future:
+        if task.executor == "process":
+            return self.process_pool.submit(
+                _run_in_worker, task.source, task.name, task_args
+            )
+        return self.pool.submit(_call, task, task_args)
+
+    def _split_reused(self, tasklist, execution):
+        results, pending = {}, []
+        for i, task in enumerate(tasklist):
+            is_dependency = i < len(tasklist) - 1
+            if execution is not None and is_dependency and task.name in execution:
+                results[task.name] = execution.reuse(task.name)
+            else:
+                pending.append(task)
+        return results, pending
+
+    @staticmethod
+    def _dependents(tasks: list[Task]) -> tuple[dict, dict]:
+        names = {task.name for task in tasks}
+        waiting_on = {
+            task.name: {d for d in task.dependencies if d in names} for task in tasks
+        }
+        dependents = {task.name: [] for task in tasks}
+        for task in tasks:
+            for dep in waiting_on[task.name]:
+                dependents[dep].append(task)
+        return waiting_on, dependents
+
+    @staticmethod
+    def _task_args(task: Task, results: dict, args: dict, ctx: dict) -> dict:
+        # Dependencies are placed in declaration order whatever order they finished in.
+        this_tasks_args = {
+            dep: results[dep] if dep in results else ctx[dep][-1]
+            for dep in task.dependencies
+        }
+        if args is not None:
+            this_tasks_args.update(args)
+        return this_tasks_args
+
+    def run(
+        self,
+        tasklist: list[Task],
+        args: dict = None,
+        ctx: dict = None,
+        execution: ExecutionContext = None,
+    ) -> dict[str, Any]:
+        """Run every task of the tasklist, returning their results by task name.
+
+        Dependencies the execution context already holds are reused, except for the
+        final task of the tasklist which always runs.
+        """
+        ctx = ctx if ctx is not None else {}
+        results, pending = self._split_reused(tasklist, execution)
+
+        if self.backend == "inline" or len(pending) < 2:
+            self._run_inline(pending, results, args, ctx, execution)
+        else:
+            self._run_threaded(pending, results, args, ctx, execution)
+
+        return results
+
+    def _finish(self, task: Task, result, results: dict, execution: ExecutionContext):
+        results[task.name] = result
+        if execution is not None:
+            execution.record(task.name, result)
+
+    def _run_inline(self, tasks, results, args, ctx, execution):
+        for task in tasks:
+            logger.debug(f"-- Running task {task.name}")
+            task_args = self._task_args(task, results, args, ctx)
+            if task.executor == "process":
+                result = self.submit(task, task_args).result()
+            else:
+                result = _call(task, task_args)
+            self._finish(task, result, results, execution)
+
+    def _run_threaded(self, tasks, results, args, ctx, execution):
+        waiting_on, dependents = self._dependents(tasks)
+        running: dict[Future, Task] = {}
+
+        def schedule(task: Task):
+            logger.debug(f"-- Scheduling task {task.name}")
+            task_args = self._task_args(task, results, args, ctx)
+            running[self.submit(task, task_args)] = task
+
+        for task in tasks:
+            if not waiting_on[task.name]:
+                schedule(task)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    result = future.result()
+                except BaseException:
+                    for other in running:
+                        other.cancel()
+                    wait(running)
+                    raise
+
+                self._finish(task, result, results, execution)
+                for dependent in dependents[task.name]:
+                    waiting_on[dependent.name].discard(task.name)
+                    if not waiting_on[dependent.name]:
+                        schedule(dependent)
+
+    async def arun(
+        self,
+        tasklist: list[Task],
+        args: dict = None,
+        ctx: dict = None,
+        execution: ExecutionContext = None,
+    ) -> dict[str, Any]:
+        """Run every task of the tasklist on the running event loop, see `run`."""
+        ctx = ctx if ctx is not None else {}
+        results, pending = self._split_reused(tasklist, execution)
+        waiting_on, dependents = self._dependents(pending)
+        loop = asyncio.get_running_loop()
+
+        running: dict[asyncio.Future, Task] = {}
+
+        def schedule(task: Task):
+            logger.debug(f"-- Scheduling task {task.name}")
+            task_args = self._task_args(task, results, args, ctx)
+            if task.is_async and task.executor != "process":
+                future = asyncio.ensure_future(task.run(task_args))
+            else:
+                future = asyncio.wrap_future(self.submit(task, task_args), loop=loop)
+            running[future] = task
+
+        for task in pending:
+            if not waiting_on[task.name]:
+                schedule(task)
+
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                if future.exception() is not None:
+                    for other in running:
+                        other.cancel()
+                    await asyncio.gather(*running, return_exceptions=True)
+                    raise future.exception()
+
+                self._finish(task, future.result(), results, execution)
+                for dependent in dependents[task.name]:
+                    waiting_on[dependent.name].discard(task.name)
+                    if not waiting_on[dependent.name]:
+                        schedule(dependent)
+
+        return results
@@ -0,0 +1,112 @@
+import ast
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from ..utils import ActionDataclassMixin
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    """What a source scan knows about a task class without importing it."""
+
+    name: str
+    source: str
+    description: Optional[str] = None
+    dependencies: list[str] = field(default_factory=list)
+    requested_actions: list[str] = field(default_factory=list)
+    executor: Optional[str] = None
+    is_async: bool = False
+
+
+# Scans by (path, mtime, size), so reloading a service or sharing its files between
+# entities does not parse them again.
+_manifests: dict[tuple[str, int, int], dict[str, Optional[TaskSpec]]] = {}
+
+
+def _is_task_base(base: ast.expr) -> bool:
+    return (isinstance(base, ast.Name) and base.id == "Task") or (
+        isinstance(base, ast.Attribute) and base.attr == "Task"
+    )
+
+
+def _scan_class(node: ast.ClassDef, source: str) -> Optional[TaskSpec]:
+    """A spec for a direct Task subclass, or None if the scan can't be trusted."""
+    if not all(_is_task_base(b) for b in node.bases):
+        return None
+
+    attrs, is_async = {}, False
+    for stmt in node.body:
+        if isinstance(stmt, ast.AsyncFunctionDef) and stmt.name == "run":
+            is_async = True
+        if isinstance(stmt, ast.Assign):
+            targets = [t.id for t in stmt.targets if isinstance(t, ast.Name)]
+        elif isinstance(stmt, ast.AnnAssign) and isinstance(stmt.target, ast.Name):
+            targets = [stmt.target.id] if stmt.value is not None else []
+        else:
+            continue
+
+        for target in targets:
+            if target in ("dependencies", "requested_actions", "executor"):
+                try:
+                    attrs[target] = ast.literal_eval(stmt.value)
+                except ValueError:
+                    return None
+
+    return TaskSpec(
+        name=node.name,
+        source=source,
+        description=ast.get_docstring(node, clean=False),
+        dependencies=list(attrs.get("dependencies") or []),
+        requested_actions=list(attrs.get("requested_actions") or []),
+        executor=attrs.get("executor"),
+        is_async=is_async,
+    )
+
+
+def scan_tasks(path: Path) -> dict[str, Optional[TaskSpec]]:
+    """Find the task classes a module defines by parsing, not executing, it.
+
+    Classes without bases are left out. A class maps to None when it can't be
+    described without importing the module, such as one inheriting from another
+    task or computing its dependencies.
+    """
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _manifests:
+        _manifests[key] = {
+            node.name: _scan_class(node, str(path))
+            for node in ast.parse(path.read_text(), str(path)).body
+            if isinstance(node, ast.ClassDef) and node.bases
+        }
+    return _manifests[key]
+
+
+class LazyTask(ActionDataclassMixin):
+    """Stands in for a task whose module has not been imported yet.
+
+    It has the attributes the managers and the executor read before running a
+    task. Actions registered on it are passed on to the task once it is loaded,
+    and running it loads the task through `load`.
+    """
+
+    def __init__(self, spec: TaskSpec, load: Callable[[str], object]):
+        super().__init__()
+        self.spec = spec
+        self.name = spec.name
+        self.description = spec.description
+        self.dependencies = list(spec.dependencies)
+        self.requested_actions = list(spec.requested_actions)
+        self.executor = spec.executor
+        self.source = spec.source
+        self.is_async = spec.is_async
+        self.__load = load
+
+    def run(self, *args, **kwargs):
+        return self.__load(self.name).run(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return self.run(*args, **kwargs)
+
+    def __repr__(self):
+        return f"LazyTask({self.name}, {self.source})"
@@ -4,16 +4,24 @@ from typing import Optional
 
 from ..task import Task
 from . import Service
-from ..utils import ActionDataclassMixin
+from .executor import TaskExecutor
+from ..utils import ActionDataclassMixin, DependencyError
+from ..workflow.context import ExecutionContext
 
 logger = logging.getLogger(__name__)
 
 
 class ServiceManager(ActionDataclassMixin):
-    def __init__(self):
+    def __init__(self, executor: TaskExecutor = None, lazy: bool = False):
         super(ActionDataclassMixin, self).__init__()
 
         self.services = {}
+        self.executor = executor or TaskExecutor()
+        # Load services with lazy task imports, see Service._load_tasks.
+        self.lazy = lazy
+        self.__plans: dict[str, tuple[Task, ...]] = {}
+        # Loaded task name -> the first service providing it, kept by add_service.
+        self.__owners: dict[str, Service] = {}
 
         logger.debug(f"Created new service manager {self}")
 
@@ -29,26 +37,51 @@ class ServiceManager(ActionDataclassMixin):
                 if callable(a[1]):
                     task.register_action(action, *a)
 
+    def reset(self):
+        self.services = {}
+        self.__owners = {}
+        self.invalidate_plans()
+
     def load_services(self, services: list[Path]):
         for service in services:
             if not service.exists():
                 logger.error(f"Service file {service} does not exist.")
                 continue
 
-            S = Service.load_from_yaml(service)
-            self.services[S.name] = S
+            S = Service.load_from_yaml(service, self.lazy)
+            self.add_service(S)
 
             # All tasks need to register any actions the service manager offers
             for task in S.get_tasks():
                 self._register_task_actions(task)
 
+        # Compile every plan now so dependency cycles fail at load, not per request.
+        self.compile_plans()
+
         logger.debug(f"SM: Loaded services {self.services}.")
 
-    def find_owner_service(self, task: str) -> Optional[Service]:
+    def add_service(self, service: Service):
+        """Add or replace a service, invalidating any compiled plans."""
+        replaced = service.name in self.services
+        self.services[service.name] = service
+        for task in service.get_tasks():
+            self.executor.register(task)
+
+        if replaced:
+            self._index_tasks()
+        else:
+            for name in service.get_task_names():
+                self.__owners.setdefault(name, service)
+        self.invalidate_plans()
+
+    def _index_tasks(self):
+        self.__owners = {}
         for service in self.services.values():
-            if task in service.tasks:
-                return service
-        return None
+            for name in service.get_task_names():
+                self.__owners.setdefault(name, service)
+
+    def find_owner_service(self, task: str) -> Optional[Service]:
+        return self.__owners.get(task)
 
     def get_service(self, service: str) -> Optional[Service]:
         if service in self.services:
@@ -71,62 +104,123 @@ class ServiceManager(ActionDataclassMixin):
             tasks += service.get_tasks()
         return tasks
 
-    def find_task(self, task: str) -> Optional[Task]:
-        owner = self.find_owner_service(task)
+    def find_task(self, task: str, load: bool = True) -> Optional[Task]:
+        owner = self.__owners.get(task)
         if owner:
-            return owner.get_task(task)
+            return owner.get_task(task, load)
         return None
 
-    def resolve_task_dependencies(self, task: str) -> list[Task]:
-        """Turn a task into a list of tasks, with dependencies first"""
-        t = self.find_task(task)
-
-        if not t or t is None:
-            return []
+    def invalidate_plans(self):
+        self.__plans.clear()
 
-        tasks = []
+    def compile_plans(self) -> dict[str, tuple[Task, ...]]:
+        """Compile the plan of every loaded task, raising DependencyError on cycles"""
+        for service in self.services.values():
+            for name in service.get_task_names():
+                self.compile_plan(name)
+
+        return dict(self.__plans)
+
+    def compile_plan(self, task: str) -> tuple[Task, ...]:
+        """Turn a task into a deduplicated topological plan, dependencies first.
+
+        Plans are cached per task name until the loaded services change. Missing
+        dependencies are skipped, as they may be provided by services added later.
+        """
+        if task in self.__plans:
+            return self.__plans[task]
+
+        root = self.find_task(task, load=False)
+        if root is None:
+            return ()
+
+        plan = []
+        done = set()
+        stack = [(task, root, iter(root.dependencies or []))]
+        visiting = [task]
+        while stack:
+            name, t, deps = stack[-1]
+            for dep in deps:
+                if dep in done:
+                    continue
+
+                if dep in visiting:
+                    cycle = visiting[visiting.index(dep) :] + [dep]
+                    raise DependencyError(
+                        f"Dependency cycle for task {task}: {' -> '.join(cycle)}"
+                    )
+
+                if dep in self.__plans:
+                    for d in self.__plans[dep]:
+                        if d.name not in done:
+                            done.add(d.name)
+                            plan.append(d)
+                    continue
+
+                d = self.find_task(dep, load=False)
+                if d is None:
+                    logger.debug(f"Dependency {dep} of {name} not found, skipping.")
+                    continue
+
+                stack.append((dep, d, iter(d.dependencies or [])))
+                visiting.append(dep)
+                break
+            else:
+                stack.pop()
+                visiting.pop()
+                done.add(name)
+                plan.append(t)
+
+        self.__plans[task] = tuple(plan)
+        return self.__plans[task]
 
-        if (
-            not hasattr(t, "dependencies")
-            or t.dependencies is None
-            or len(t.dependencies) == 0
-        ):
-            return [t]
+    def resolve_task_dependencies(self, task: str) -> list[Task]:
+        """Turn a task into a list of tasks, with dependencies first"""
+        return list(self.compile_plan(task))
 
-        for dep in t.dependencies:
-            if dep == task:
-                continue
-            tasks = self.resolve_task_dependencies(dep) + tasks
-        tasks.append(t)
+    def _final_result(self, tasklist: list[Task], results: dict, ctx: dict):
+        if len(tasklist) == 0:
+            final = None
+            logger.error(
+                f"Tasklist was empty, {tasklist=}, {ctx=} - did you define the requested Task?"
+            )
+        else:
+            final = results[tasklist[-1].name]
 
-        return tasks
+        logger.debug(f"Tasklist {final=}, {results=}")
+        return final
 
     def run_tasklist(
-        self, tasklist: list[Task], args: dict = None, ctx: dict = None
+        self,
+        tasklist: list[Task],
+        args: dict = None,
+        ctx: dict = None,
+        execution: ExecutionContext = None,
     ) -> dict:
-        """Run a tasklist in a context"""
+        """Run a tasklist in a context with this manager's executor
+
+        With an execution context, dependencies it already holds a result for are
+        reused rather than run again. The final task of the tasklist always runs.
+        """
         logger.debug(f"Running {tasklist=}")
 
         ctx = ctx or {}
-        for task in tasklist:
-            this_tasks_args = {dep: ctx[dep].pop() for dep in task.dependencies}
-            if args is not None:
-                this_tasks_args.update(args)
-
-            logger.debug(f"-- Running task {task.name}, {ctx=}")
-            result = task.run(this_tasks_args)
-
-            ctx.setdefault(task.name, []).append(result)
+        results = self.executor.run(tasklist, args, ctx, execution)
+        return self._final_result(tasklist, results, ctx)
+
+    async def arun_tasklist(
+        self,
+        tasklist: list[Task],
+        args: dict = None,
+        ctx: dict = None,
+        execution: ExecutionContext = None,
+    ) -> dict:
+        """Run a tasklist on the running event loop, see `run_tasklist`"""
+        logger.debug(f"Running {tasklist=}")
 
-        try:
-            final = ctx[tasklist[-1].name].pop()
-        except IndexError:
-            final = None
-            logger.error(
-                f"Tasklist was empty, {tasklist=}, {ctx=} - did you define the requested Task?"
-            )
-        logger.debug(f"Tasklist {final=}, {ctx=} (should be empty)")
-        return final
+        ctx = ctx or {}
+        results = await self.executor.arun(tasklist, args, ctx, execution)
+        return self._final_result(tasklist, results, ctx)
 
     def run_task(self, task: str, args: dict = None, ctx: dict = None) -> dict:
         """Run a task in a context"""
@@ -134,3 +228,10 @@ class ServiceManager(ActionDataclassMixin):
 
         tasklist = self.resolve_task_dependencies(task)
         return self.run_tasklist(tasklist, args, ctx)
+
+    async def arun_task(self, task: str, args: dict = None, ctx: dict = None) -> dict:
+        """Run a task in a context on the running event loop"""
+        logger.debug(f"Running {task=}")
+
+        tasklist = self.resolve_task_dependencies(task)
+        return await self.arun_tasklist(tasklist, args, ctx)
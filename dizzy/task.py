@@ -1,6 +1,6 @@
 from abc import abstractmethod, ABC
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import ClassVar, Optional
 
 from .utils import ActionDataclassMixin
 
@@ -12,6 +12,13 @@ class Task(ABC, ActionDataclassMixin):
     dependencies: Optional[list[str]] = field(default_factory=list)
     requested_actions: Optional[list[str]] = field(default_factory=list)
 
+    # Set to "process" for CPU-bound tasks to run them in the executor's process pool.
+    executor: ClassVar[Optional[str]] = None
+    # The file the task was loaded from, set by the Service loading it.
+    source: ClassVar[Optional[str]] = None
+    # Whether run is a coroutine function, set by the Service loading it.
+    is_async: ClassVar[bool] = False
+
     def __post_init__(self):
         if self.name is None:
             self.name = self.__class__.__name__
@@ -21,7 +28,10 @@ class Task(ABC, ActionDataclassMixin):
 
     @abstractmethod
     def run(self, *args, **kwargs):
-        """run can also be defined as a @staticmethod if you do not need self.try_run_action. (Have no requested_actions)"""
+        """run can also be defined as a @staticmethod if you do not need self.try_run_action. (Have no requested_actions)
+
+        run can also be an `async def`, the executor then awaits it on the event loop.
+        """
         pass
 
     def __call__(self, *args, **kwargs):
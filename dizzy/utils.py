@@ -1,7 +1,14 @@
+import copy
+import hashlib
 import importlib.util
 import logging
 import os
 from pathlib import Path
+import sys
+import threading
+from typing import Optional
+
+import yaml
 
 logger = logging.getLogger(__name__)
 
@@ -10,12 +17,109 @@ class DependencyError(Exception):
     pass
 
 
+# Modules by resolved path with the (mtime, size) they were loaded at.
+_modules: dict[Path, tuple[tuple[int, int], object]] = {}
+_modules_lock = threading.Lock()
+# One lock per module path, so different modules can be imported concurrently.
+_module_locks: dict[Path, threading.Lock] = {}
+# Parsed YAML documents by resolved path, same as modules.
+_documents: dict[Path, tuple[tuple[int, int], object]] = {}
+# Directory listings by (root, recursive), with the mtimes of every directory read.
+Listing = list[tuple[Path, bool]]
+_listings: dict[tuple[Path, bool], tuple[dict[Path, int], Listing]] = {}
+
+
+def _version(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _mtime(directory: Path) -> Optional[int]:
+    try:
+        return directory.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def list_dir(root: Path, recursive: bool = False) -> Listing:
+    """Sorted (path, is_dir) of the entries of a directory, or of its whole tree.
+
+    Listings are kept until one of the directories read changes, a stat per
+    directory is all it takes to reuse one.
+    """
+    root = Path(root)
+    cached = _listings.get((root, recursive))
+    if cached is not None and all(_mtime(d) == m for d, m in cached[0].items()):
+        return cached[1]
+
+    dirs, entries, pending = {}, [], [root]
+    while pending:
+        directory = pending.pop()
+        dirs[directory] = _mtime(directory)
+        with os.scandir(directory) as it:
+            for entry in it:
+                is_dir = entry.is_dir()
+                entries.append((Path(entry.path), is_dir))
+                if is_dir and recursive:
+                    pending.append(Path(entry.path))
+
+    entries.sort()
+    _listings[(root, recursive)] = (dirs, entries)
+    return entries
+
+
+def load_yaml(path: Path) -> object:
+    """Parse a YAML file, once per process until the file changes.
+
+    Returns a copy, callers may modify it.
+    """
+    path = Path(path).resolve()
+    version = _version(path)
+
+    cached = _documents.get(path)
+    if cached is None or cached[0] != version:
+        with open(path) as f:
+            cached = (version, yaml.safe_load(f))
+        _documents[path] = cached
+
+    return copy.deepcopy(cached[1])
+
+
+def module_name(path: Path) -> str:
+    """A name unique to the file, same-named files in other services don't collide."""
+    digest = hashlib.sha1(str(path).encode()).hexdigest()[:12]
+    return f"dizzy_task_{path.stem}_{digest}"
+
+
 def load_module(path: Path) -> object:
-    """Load a module from a path."""
-    module_name = path.stem
-    spec = importlib.util.spec_from_file_location(module_name, path)
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    """Load a module from a path, once per process until the file changes."""
+    path = Path(path).resolve()
+    version = _version(path)
+
+    with _modules_lock:
+        lock = _module_locks.setdefault(path, threading.Lock())
+
+    with lock:
+        if path in _modules and _modules[path][0] == version:
+            return _modules[path][1]
+
+        name = module_name(path)
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        # Registered so its classes can be pickled and dataclasses resolve it.
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            if path in _modules:
+                sys.modules[name] = _modules[path][1]
+            else:
+                del sys.modules[name]
+            raise
+
+        if path in _modules:
+            logger.debug(f"Reloaded changed module {path}")
+        _modules[path] = (version, module)
 
     return module
 
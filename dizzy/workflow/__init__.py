@@ -0,0 +1,7 @@
+from .context import ExecutionContext
+from .plan import WorkflowPlan
+
+__all__ = [
+    "ExecutionContext",
+    "WorkflowPlan",
+]
@@ -0,0 +1,32 @@
+import logging
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionContext:
+    """Results of the tasks completed during a single workflow run.
+
+    Dependencies already completed by an earlier step are reused from here instead
+    of being run again.
+    """
+
+    def __init__(self):
+        self.results: dict[str, Any] = {}
+        self.executed = 0
+        self.saved = 0
+
+    def __contains__(self, task: str) -> bool:
+        return task in self.results
+
+    def record(self, task: str, result: Any):
+        self.results[task] = result
+        self.executed += 1
+
+    def reuse(self, task: str) -> Any:
+        logger.debug(f"Reusing result of {task}")
+        self.saved += 1
+        return self.results[task]
+
+    def stats(self) -> dict[str, int]:
+        return {"executed": self.executed, "saved": self.saved}
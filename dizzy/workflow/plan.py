@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+import logging
+from types import MappingProxyType
+from typing import Mapping
+
+from ..task import Task
+from ..utils import DependencyError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WorkflowPlan:
+    """A workflow spec like `"A -> B -> C"` compiled against a ServiceManager.
+
+    Holds the resolved step tasks, each step's dependency plan and the merged
+    dependency DAG of the whole workflow, so running it needs no parsing or lookups.
+    """
+
+    name: str
+    steps: tuple[str, ...]
+    tasks: tuple[Task, ...]
+    plans: tuple[tuple[Task, ...], ...]
+    order: tuple[Task, ...]
+    edges: Mapping[str, tuple[str, ...]]
+
+    @staticmethod
+    def parse(spec: str) -> tuple[str, ...]:
+        return tuple(spec.replace(" ", "").split("->"))
+
+    @classmethod
+    def compile(cls, name: str, spec: str, service_manager) -> "WorkflowPlan":
+        steps = cls.parse(spec)
+
+        tasks, plans = [], []
+        for step in steps:
+            try:
+                task = service_manager.find_task(step, load=False)
+            except (KeyError, ValueError):
+                task = None
+            if task is None:
+                raise DependencyError(f"Workflow {name} step {step} not found.")
+            tasks.append(task)
+            plans.append(service_manager.compile_plan(step))
+
+        # Each step plan is topologically sorted, so keeping first occurrences is too.
+        order = {}
+        for plan in plans:
+            for task in plan:
+                order.setdefault(task.name, task)
+
+        edges = {
+            n: tuple(d for d in t.dependencies or [] if d in order)
+            for n, t in order.items()
+        }
+
+        logger.debug(f"Compiled workflow {name}: {steps} -> {list(order)}")
+        return cls(
+            name=name,
+            steps=steps,
+            tasks=tuple(tasks),
+            plans=tuple(plans),
+            order=tuple(order.values()),
+            edges=MappingProxyType(edges),
+        )
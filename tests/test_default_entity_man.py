@@ -25,3 +25,8 @@ class TestServices:
 
     def test_status_service(self):
         assert self.em.find_service("status").name == "status"
+
+    def test_only_entities(self):
+        em = DaemonEntityManager(entities=["einz"])
+        assert list(em.entities) == ["einz"]
+        assert em.find_service("project").name == "project"
@@ -1,6 +1,11 @@
+import asyncio
+import dataclasses
 from pathlib import Path
+
+import pytest
 from dizzy import Entity, EntityManager
-from dizzy.daemon import all_entities, DaemonEntityManager
+from dizzy.daemon import all_entities, DaemonEntityManager, SettingsManager
+from dizzy.utils import DependencyError
 
 
 class TestEntity:
@@ -38,6 +43,26 @@ class TestEntityManager:
         assert self.em.possible_actions == ["entity_info"]
 
 
+class TestParallelLoading:
+    def test_same_result_as_serial(self):
+        settings = SettingsManager().settings
+        serial, parallel = EntityManager(), EntityManager()
+        serial.load(settings.common_services, settings.default_entities)
+        report = parallel.load(
+            settings.common_services, settings.default_entities, workers=4
+        )
+
+        assert parallel.get_entity_names() == serial.get_entity_names()
+        assert parallel.get_workflows() == serial.get_workflows()
+        assert parallel.find_task("D").possible_actions == (
+            serial.find_task("D").possible_actions
+        )
+
+        assert list(report.phases) == ["parse", "discover", "import", "register"]
+        assert report.counts["entities"] == len(settings.default_entities)
+        assert parallel.load_report is report
+
+
 class TestDaemonEntityManager:
     def setup_method(self):
         self.test_path = Path("test.yaml")
@@ -66,3 +91,76 @@ class TestDaemonEntityManager:
         result = D.run()
 
         print(result, ctx)
+
+    def test_indexes_match_a_scan(self):
+        def scan(task):
+            for entity in self.em.get_entities():
+                for service in entity.service_manager.get_services():
+                    if task in service.get_task_names():
+                        return entity, service
+
+        tasks = {
+            t
+            for e in self.em.get_entities()
+            for s in e.service_manager.get_services()
+            for t in s.get_task_names()
+        }
+        for task in tasks:
+            owner, owner_service = scan(task)
+            assert self.em.find_owner_entity(task) is owner
+            assert self.em.find_owner_service(task) is owner_service
+            assert self.em.find_task(task) is owner_service.get_task(task)
+
+        assert self.em.find_service("project").name == "project"
+        assert self.em.find_service_entities("project") == [
+            e.name for e in self.em.get_entities() if "project" in e.services
+        ]
+
+    def test_reset_clears_indexes(self):
+        self.em.reset()
+        assert self.em.find_task("D") is None
+        assert self.em.find_service("project") is None
+        assert self.em.find_workflow_entity("einzy") is None
+
+
+class TestWorkflowPlans:
+    def setup_method(self):
+        self.em = DaemonEntityManager()
+
+    def test_plan_compiled_at_load(self):
+        einz = self.em.get_entity("einz")
+        plan = einz.get_workflow_plan("einzy")
+
+        assert plan.steps == ("EinzyA", "EinzyB")
+        assert [t.name for t in plan.order] == ["EinzyA", "EinzyB"]
+        assert plan.edges == {"EinzyA": (), "EinzyB": ("EinzyA",)}
+        assert einz.get_workflow_plan("einzy") is plan
+
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            plan.steps = ()
+
+    def test_run_workflow(self):
+        ctx = self.em.run_workflow("einzy", entity_name="einz")
+        assert ctx["workflow"]["result"] == {"EinzyA": "EinzyA", "EinzyB": "EinzyAB"}
+
+    def test_arun_workflow(self):
+        ctx = asyncio.run(self.em.arun_workflow("einzy", entity_name="einz"))
+        assert ctx["workflow"]["result"] == {"EinzyA": "EinzyA", "EinzyB": "EinzyAB"}
+        assert ctx["workflow"]["executions"] == {"executed": 2, "saved": 1}
+
+    def test_shared_dependencies_run_once(self):
+        ctx = self.em.run_workflow("einzy", entity_name="einz")
+        assert ctx["workflow"]["executions"] == {"executed": 2, "saved": 1}
+
+    def test_missing_step_fails_at_load(self, tmp_path):
+        entity_yml = tmp_path / "broken" / "entity.yml"
+        entity_yml.parent.mkdir()
+        Entity(
+            name="broken",
+            description="",
+            services=[],
+            workflows={"nope": "Nothing -> Here"},
+        ).save_to_yaml(entity_yml)
+
+        with pytest.raises(DependencyError, match="Nothing"):
+            Entity.load_from_yaml(entity_yml)
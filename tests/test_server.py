@@ -1,7 +1,17 @@
 import asyncio
+import json
 import os
 import time
-from dizzy.daemon import SimpleRequestServer
+import zmq
+from dizzy.daemon import (
+    BrokerServer,
+    RemoteWorker,
+    ShardedBroker,
+    SimpleRequestServer,
+    WorkerBroker,
+)
+from dizzy.daemon.server import remote
+from dizzy.daemon.server.shard import HashRing, partition
 from dizzy.daemon.client.asy import SimpleAsyncClient
 import logging
 import pytest
@@ -88,5 +98,376 @@ class TestServer:
     #         t.join()
 
 
+class SlowWorkflowServer(SimpleRequestServer):
+    async def handle_entity_workflow(self, request, response):
+        if request.workflow == "slow":
+            await asyncio.sleep(1)
+            response.set_result("slow")
+        else:
+            await super().handle_entity_workflow(request, response)
+
+
+class ServerThread(threading.Thread):
+    """Runs a server on its own event loop until stopped."""
+
+    def __init__(self, server_cls=SimpleRequestServer, **kwargs):
+        super().__init__(daemon=True)
+        self.server_cls = server_cls
+        self.kwargs = kwargs
+        self.ready = threading.Event()
+
+    def run(self):
+        async def serve():
+            self.loop = asyncio.get_running_loop()
+            self.server = self.server_cls(**self.kwargs)
+            self.ready.set()
+            await self.server.run()
+
+        asyncio.run(serve())
+
+    def start(self):
+        super().start()
+        self.ready.wait(10)
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.server.stop)
+        self.join(5)
+
+
+def dealer(port: int) -> zmq.Socket:
+    socket = zmq.Context.instance().socket(zmq.DEALER)
+    socket.setsockopt(zmq.LINGER, 0)
+    socket.connect(f"tcp://127.0.0.1:{port}")
+    return socket
+
+
+def request(socket: zmq.Socket, **body):
+    socket.send_multipart([b"", json.dumps(body).encode()])
+
+
+def response(socket: zmq.Socket, timeout=5000) -> dict:
+    assert socket.poll(timeout), "no response"
+    _, message = socket.recv_multipart()
+    return json.loads(message)
+
+
+class TestConcurrentServer:
+    def setup_method(self):
+        self.thread = ServerThread(SlowWorkflowServer, port=7778).start()
+
+    def teardown_method(self):
+        self.thread.stop()
+
+    def test_workflow(self):
+        client = dealer(7778)
+        request(client, entity="einz", workflow="einzy")
+
+        message = response(client)
+        assert message["status"] == "completed"
+        assert message["result"] == {"EinzyA": "EinzyA", "EinzyB": "EinzyAB"}
+        assert message["info"]["executions_saved"] == ["1"]
+        client.close()
+
+    def test_slow_request_does_not_block(self):
+        slow, fast = dealer(7778), dealer(7778)
+
+        request(slow, entity="einz", workflow="slow")
+        time.sleep(0.1)
+        start = time.perf_counter()
+        request(fast, entity="einz", workflow="einzy")
+
+        assert response(fast)["status"] == "completed"
+        assert time.perf_counter() - start < 0.5
+        assert response(slow)["result"] == "slow"
+
+        slow.close()
+        fast.close()
+
+
+class TestAdmissionControl:
+    def setup_method(self):
+        self.thread = ServerThread(
+            SlowWorkflowServer, port=7779, max_in_flight=1, max_pending=1
+        ).start()
+
+    def teardown_method(self):
+        self.thread.stop()
+
+    def test_overloaded(self):
+        clients = [dealer(7779) for _ in range(3)]
+        for client in clients:
+            request(client, entity="einz", workflow="slow")
+            time.sleep(0.1)
+
+        rejected = response(clients[2], timeout=500)
+        assert rejected["status"] == "overloaded"
+        assert "Overloaded" in rejected["errors"]
+        assert response(clients[0])["result"] == "slow"
+        assert response(clients[1])["result"] == "slow"
+
+        for client in clients:
+            client.close()
+
+    def test_expired_requests_are_dropped(self):
+        slow, impatient = dealer(7779), dealer(7779)
+
+        request(slow, entity="einz", workflow="slow")
+        time.sleep(0.1)
+        request(impatient, entity="einz", workflow="slow", timeout=0.2)
+
+        assert response(slow)["result"] == "slow"
+        dropped = response(impatient, timeout=500)
+        assert dropped["status"] == "expired"
+        assert dropped["result"] is None
+        assert self.thread.server.shed == {"overloaded": 0, "expired": 1}
+
+        slow.close()
+        impatient.close()
+
+
+class TestBrokerServer:
+    def setup_method(self):
+        self.broker = BrokerServer(port=7780, workers=2)
+        self.thread = threading.Thread(target=self.broker.run, daemon=True)
+        self.thread.start()
+
+    def teardown_method(self):
+        self.broker.stop()
+        self.thread.join(10)
+
+    def test_workers_answer_requests(self):
+        clients = [dealer(7780) for _ in range(4)]
+        for client in clients:
+            request(client, entity="einz", workflow="einzy")
+
+        for client in clients:
+            message = response(client, timeout=30000)
+            assert message["result"] == {"EinzyA": "EinzyA", "EinzyB": "EinzyAB"}
+            client.close()
+
+    def test_dead_workers_are_restarted(self):
+        client = dealer(7780)
+        request(client, entity="einz", workflow="einzy")
+        assert response(client, timeout=30000)["status"] == "completed"
+
+        self.broker.workers[0].kill()
+        deadline = time.time() + 5
+        while self.broker.restarts == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        assert self.broker.restarts == 1
+
+        for _ in range(4):
+            request(client, entity="einz", workflow="einzy")
+            assert response(client, timeout=30000)["status"] == "completed"
+        client.close()
+
+    def test_drain(self):
+        client = dealer(7780)
+        request(client, entity="einz", workflow="einzy")
+        assert response(client, timeout=30000)["status"] == "completed"
+
+        self.broker.stop()
+        self.thread.join(10)
+
+        assert not self.thread.is_alive()
+        assert all(w.exitcode == 0 for w in self.broker.workers)
+        client.close()
+
+
+class FakeWorker(threading.Thread):
+    """Speaks the worker side of the WorkerBroker protocol, answering with its name."""
+
+    def __init__(self, name: str, entities: dict, port=7782, capacity=1, answer=True):
+        super().__init__(daemon=True)
+        self.answer = answer
+        self.worker_name = name
+        self.entities = entities
+        self.port = port
+        self.capacity = capacity
+        self.jobs = []
+        self.alive = True
+
+    def run(self):
+        socket = zmq.Context.instance().socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(f"tcp://127.0.0.1:{self.port}")
+        capabilities = {
+            "entities": self.entities,
+            "services": [],
+            "capacity": self.capacity,
+        }
+        socket.send_multipart([remote.READY, json.dumps(capabilities).encode()])
+
+        while self.alive:
+            if socket.poll(50):
+                command, *payload = socket.recv_multipart()
+                if command == remote.REQUEST:
+                    job, client, _ = payload
+                    self.jobs.append(job)
+                    if not self.answer:
+                        continue
+                    body = json.dumps({"result": self.worker_name}).encode()
+                    socket.send_multipart([remote.REPLY, job, client, body])
+            socket.send_multipart([remote.HEARTBEAT])
+        socket.close()
+
+    def kill(self):
+        self.alive = False
+        self.join(5)
+
+
+class TestWorkerBroker:
+    def setup_method(self):
+        self.broker = WorkerBroker(
+            port=7781, worker_port=7782, heartbeat_interval=0.1, heartbeat_liveness=3
+        )
+        self.thread = threading.Thread(target=self.broker.run, daemon=True)
+        self.thread.start()
+        self.workers = []
+
+    def teardown_method(self):
+        for worker in self.workers:
+            worker.kill()
+        self.broker.stop()
+        self.thread.join(5)
+
+    def start_worker(self, *args, **kwargs) -> FakeWorker:
+        worker = FakeWorker(*args, **kwargs)
+        worker.start()
+        self.workers.append(worker)
+        deadline = time.time() + 5
+        while len(self.broker.workers) < len(self.workers) and time.time() < deadline:
+            time.sleep(0.01)
+        return worker
+
+    def test_routes_to_capable_worker(self):
+        self.start_worker("einz-worker", {"einz": ["einzy"]})
+        self.start_worker("zwei-worker", {"zwei": ["zweiy"]})
+        client = dealer(7781)
+
+        request(client, entity="zwei", workflow="zweiy")
+        assert response(client)["result"] == "zwei-worker"
+        request(client, entity="einz", workflow="einzy")
+        assert response(client)["result"] == "einz-worker"
+
+        request(client, entity="einz", workflow="zweiy")
+        rejected = response(client)
+        assert rejected["status"] == "error"
+        assert "NoWorker" in rejected["errors"]
+        client.close()
+
+    def test_jobs_of_dead_workers_are_requeued(self):
+        silent = self.start_worker("silent", {"einz": ["einzy"]}, answer=False)
+        self.start_worker("backup", {"einz": ["einzy"]})
+        client = dealer(7781)
+
+        request(client, entity="einz", workflow="einzy")
+        deadline = time.time() + 5
+        while not silent.jobs and time.time() < deadline:
+            time.sleep(0.01)
+        silent.kill()
+
+        assert response(client)["result"] == "backup"
+        assert self.broker.requeued == 1
+        client.close()
+
+    def test_remote_worker(self):
+        worker = ServerThread(
+            RemoteWorker, connect="tcp://127.0.0.1:7782", heartbeat_interval=0.1
+        ).start()
+        deadline = time.time() + 10
+        while not self.broker.workers and time.time() < deadline:
+            time.sleep(0.05)
+        (node,) = self.broker.workers.values()
+        assert "einzy" in node.entities["einz"]
+
+        client = dealer(7781)
+        request(client, entity="einz", workflow="einzy")
+        message = response(client)
+        assert message["status"] == "completed"
+        assert message["result"] == {"EinzyA": "EinzyA", "EinzyB": "EinzyAB"}
+
+        worker.loop.call_soon_threadsafe(worker.server.drain)
+        worker.join(5)
+        assert not worker.is_alive()
+        client.close()
+
+
+class TestSharding:
+    def test_partition(self):
+        entities = [f"entity{i}" for i in range(20)]
+        shards = partition(entities, {"hot": ["entity3"]}, workers=3)
+
+        assert shards["hot"] == ["entity3"]
+        assigned = [e for es in shards.values() for e in es]
+        assert sorted(assigned) == sorted(entities)
+        assert partition(entities, {"hot": ["entity3"]}, workers=3) == shards
+
+    def test_partition_without_shards(self):
+        with pytest.raises(ValueError):
+            partition(["einz"])
+        assert partition(["einz", "zwei"], {"only": ["einz"]}) == {
+            "only": ["einz", "zwei"]
+        }
+
+    def test_hash_ring_is_consistent(self):
+        keys = [f"entity{i}" for i in range(200)]
+        before = HashRing(["a", "b", "c"])
+        after = HashRing(["a", "b", "c", "d"])
+
+        moved = [k for k in keys if before.node_for(k) != after.node_for(k)]
+        assert all(after.node_for(k) == "d" for k in moved)
+        assert len(moved) < len(keys) / 2
+
+
+class TestShardedBroker:
+    def setup_method(self):
+        self.broker = ShardedBroker(
+            ["einz", "zwei", "drei"],
+            shards={"hot": ["einz"]},
+            workers=1,
+            port=7783,
+            worker_port=7784,
+            heartbeat_interval=0.2,
+        )
+        self.thread = threading.Thread(target=self.broker.run, daemon=True)
+        self.thread.start()
+
+        deadline = time.time() + 30
+        while len(self.broker.workers) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+
+    def teardown_method(self):
+        self.broker.stop()
+        self.thread.join(10)
+
+    def test_shards_load_their_entities(self):
+        assert list(self.broker.workers[b"hot"].entities) == ["einz"]
+        assert sorted(self.broker.workers[b"shard-0"].entities) == ["drei", "zwei"]
+
+        client = dealer(7783)
+        request(client, entity="einz", workflow="einzy")
+        assert response(client, timeout=10000)["status"] == "completed"
+        client.close()
+
+    def test_dead_shard_is_restarted(self):
+        self.broker.processes["hot"].kill()
+        client = dealer(7783)
+        request(client, entity="einz", workflow="einzy")
+
+        message = response(client, timeout=30000)
+        assert message["status"] == "completed"
+        assert self.broker.restarts == 1
+        client.close()
+
+    def test_drain(self):
+        self.broker.stop()
+        self.thread.join(10)
+
+        assert not self.thread.is_alive()
+        assert all(p.exitcode == 0 for p in self.broker.processes.values())
+
+
 if __name__ == "__main__":
     pytest.main()
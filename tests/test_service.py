@@ -1,8 +1,15 @@
+import asyncio
+import os
 import pytest
+import textwrap
+import time
 from pathlib import Path
 
-from dizzy import ServiceManager, Service
+from dizzy import ServiceManager, Service, Task
+from dizzy.service import TaskExecutor
+from dizzy.service.lazy import LazyTask
 from dizzy.daemon.settings import SettingsManager
+from dizzy.utils import DependencyError, load_module
 
 SM = SettingsManager()
 
@@ -34,6 +41,14 @@ class TestServiceManager:
         final = self.man.run_tasklist(tasklist)
         assert final == "ABC"
 
+    def test_plan_is_cached(self):
+        assert self.man.compile_plan("C") is self.man.compile_plan("C")
+
+    def test_plan_invalidated_on_reload(self):
+        plan = self.man.compile_plan("C")
+        self.man.load_services([common_services["uno"]])
+        assert self.man.compile_plan("C") is not plan
+
     def test_requested_actions(self):
         assert self.man.possible_actions == ["service_info"]
 
@@ -70,3 +85,315 @@ class TestService:
 
         # assert "entity_info" in ctx  # Not runnable by services only.
         assert "service_info" in ctx
+
+
+def write_service(root: Path, name: str, tasks: dict[str, list[str]]) -> Path:
+    """Write a service whose tasks join their dependencies' results."""
+    service_dir = root / name
+    (service_dir / "tasks").mkdir(parents=True)
+
+    Service(name=name, description=name, tasks=list(tasks)).save_to_yaml(
+        service_dir / "service.yml"
+    )
+
+    source = "from dizzy import Task\n"
+    for task, dependencies in tasks.items():
+        source += textwrap.dedent(
+            f"""
+
+            class {task}(Task):
+                dependencies = {dependencies!r}
+
+                @staticmethod
+                def run(ctx):
+                    return "".join(ctx[d] for d in {dependencies!r}) + "{task}"
+            """
+        )
+    (service_dir / "tasks" / f"{name}.py").write_text(source)
+
+    return service_dir / "service.yml"
+
+
+class TestTaskPlans:
+    def test_diamond_is_deduplicated(self, tmp_path):
+        man = ServiceManager()
+        man.load_services(
+            [
+                write_service(
+                    tmp_path,
+                    "diamond",
+                    {"A": [], "B": ["A"], "C": ["A"], "D": ["B", "C"]},
+                )
+            ]
+        )
+
+        assert [t.name for t in man.compile_plan("D")] == ["A", "B", "C", "D"]
+        assert man.run_task("D") == "ABACD"
+
+    def test_cycle_rejected_at_load(self, tmp_path):
+        service = write_service(tmp_path, "cycle", {"A": ["C"], "B": ["A"], "C": ["B"]})
+
+        with pytest.raises(DependencyError, match="A -> C -> B -> A"):
+            ServiceManager().load_services([service])
+
+    def test_self_dependency_rejected(self, tmp_path):
+        service = write_service(tmp_path, "selfish", {"A": ["A"]})
+
+        with pytest.raises(DependencyError):
+            ServiceManager().load_services([service])
+
+
+class TestLazyTasks:
+    def write_marked_service(self, tmp_path, name, tasks):
+        """A service whose task module leaves a marker file when it is imported."""
+        service = write_service(tmp_path, name, tasks)
+        module = service.parent / "tasks" / f"{name}.py"
+        marker = module.with_suffix(".imported")
+        module.write_text(
+            f"from pathlib import Path\nPath({str(marker)!r}).touch()\n"
+            + module.read_text()
+        )
+        return service, marker
+
+    def test_modules_imported_on_first_use(self, tmp_path):
+        service, marker = self.write_marked_service(
+            tmp_path, "lazy", {"A": [], "B": ["A"]}
+        )
+        man = ServiceManager(lazy=True)
+        man.load_services([service])
+
+        assert not marker.exists()
+        assert man.get_service("lazy").get_task_names() == ["A", "B"]
+        assert [t.name for t in man.compile_plan("B")] == ["A", "B"]
+        assert not marker.exists()
+
+        assert man.run_task("B") == "AB"
+        assert marker.exists()
+
+    def test_get_task_imports(self, tmp_path):
+        service, marker = self.write_marked_service(tmp_path, "lazy", {"A": []})
+        lazy = Service.load_from_yaml(service, lazy=True)
+
+        assert isinstance(lazy.get_task("A", load=False), LazyTask)
+        assert not marker.exists()
+
+        assert isinstance(lazy.get_task("A"), Task)
+        assert marker.exists()
+        assert lazy.get_task("A", load=False).run({}) == "A"
+
+    def test_unscannable_modules_are_imported(self, tmp_path):
+        service, marker = self.write_marked_service(tmp_path, "lazy", {"A": []})
+        module = service.parent / "tasks" / "lazy.py"
+        module.write_text(module.read_text() + "\n\nclass B(A):\n    pass\n")
+
+        Service.load_from_yaml(service, lazy=True)
+        assert not marker.exists()
+
+        Service(name="lazy", description="", tasks=["A", "B"]).save_to_yaml(service)
+        Service.load_from_yaml(service, lazy=True)
+        assert marker.exists()
+
+
+class TestModuleInterning:
+    def test_module_loaded_once(self, tmp_path):
+        service = write_service(tmp_path, "shared", {"A": []})
+        first = Service.load_from_yaml(service)
+        second = Service.load_from_yaml(service)
+
+        assert type(first.get_task("A")) is type(second.get_task("A"))
+
+    def test_changed_module_reloaded(self, tmp_path):
+        module = tmp_path / "mod.py"
+        module.write_text("VALUE = 1\n")
+        assert load_module(module) is load_module(module)
+
+        loaded = load_module(module)
+        module.write_text("VALUE = 22\n")
+        assert load_module(module) is not loaded
+        assert load_module(module).VALUE == 22
+
+    def test_same_named_modules_do_not_collide(self, tmp_path):
+        first = write_service(tmp_path / "one", "same", {"A": []})
+        second = write_service(tmp_path / "two", "same", {"B": []})
+
+        assert Service.load_from_yaml(first).get_task_names() == ["A"]
+        assert Service.load_from_yaml(second).get_task_names() == ["B"]
+        assert load_module(first.parent / "tasks" / "same.py").__name__ != (
+            load_module(second.parent / "tasks" / "same.py").__name__
+        )
+
+
+FAN_IN_TASKS = """
+import os
+import time
+from dizzy import Task
+
+
+class Branch(Task):
+    delay = 0.2
+
+    def run(self, ctx):
+        time.sleep(self.delay)
+        return self.name
+
+
+class Slow(Branch):
+    delay = 0.3
+
+
+class Fast(Branch):
+    delay = 0.05
+
+
+class Medium(Branch):
+    pass
+
+
+class Slower(Branch):
+    delay = 0.35
+
+
+class FanIn(Task):
+    dependencies = ["Slow", "Fast", "Medium", "Slower"]
+
+    @staticmethod
+    def run(ctx):
+        return list(ctx)
+
+
+class Broken(Task):
+    dependencies = ["Fast"]
+
+    @staticmethod
+    def run(ctx):
+        raise RuntimeError("broken")
+
+
+class Crunch(Task):
+    executor = "process"
+    dependencies = ["Fast"]
+
+    @staticmethod
+    def run(ctx):
+        from dizzy.service import executor
+
+        return os.getpid(), sum(range(100_000)), list(executor._worker_modules)
+"""
+
+
+class TestTaskExecutor:
+    @pytest.fixture(autouse=True)
+    def fan_service(self, tmp_path):
+        (tmp_path / "fan" / "tasks").mkdir(parents=True)
+        Service(
+            name="fan",
+            description="fan-in",
+            tasks=["Slow", "Fast", "Medium", "Slower", "FanIn", "Broken", "Crunch"],
+        ).save_to_yaml(tmp_path / "fan" / "service.yml")
+        (tmp_path / "fan" / "tasks" / "fan.py").write_text(FAN_IN_TASKS)
+
+        self.service_yml = tmp_path / "fan" / "service.yml"
+
+    def load(self, executor: TaskExecutor) -> ServiceManager:
+        man = ServiceManager(executor)
+        man.load_services([self.service_yml])
+        return man
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            TaskExecutor("fibers")
+
+    def test_inline_runs_in_sequence(self):
+        man = self.load(TaskExecutor("inline"))
+
+        start = time.perf_counter()
+        assert man.run_task("FanIn") == ["Slow", "Fast", "Medium", "Slower"]
+        assert time.perf_counter() - start >= 0.9
+
+    def test_thread_runs_branches_concurrently(self):
+        executor = TaskExecutor("thread", max_workers=4)
+        man = self.load(executor)
+
+        start = time.perf_counter()
+        assert man.run_task("FanIn") == ["Slow", "Fast", "Medium", "Slower"]
+        assert time.perf_counter() - start < 0.6
+
+        executor.shutdown()
+
+    def test_thread_propagates_errors(self):
+        executor = TaskExecutor("thread", max_workers=2)
+        man = self.load(executor)
+
+        with pytest.raises(RuntimeError, match="broken"):
+            man.run_task("Broken")
+
+        executor.shutdown()
+
+    def test_process_tasks_run_in_warm_workers(self):
+        executor = TaskExecutor("thread", max_processes=1)
+        man = self.load(executor)
+
+        pid, total, preloaded = man.run_task("Crunch")
+
+        assert pid != os.getpid()
+        assert total == sum(range(100_000))
+        assert preloaded == [str(self.service_yml.parent / "tasks" / "fan.py")]
+
+        executor.shutdown()
+
+
+ASYNC_TASKS = """
+import asyncio
+import threading
+from dizzy import Task
+
+
+class Wait(Task):
+    async def run(self, ctx):
+        await asyncio.sleep(0.2)
+        return "Wait"
+
+
+class Where(Task):
+    dependencies = ["Wait"]
+
+    @staticmethod
+    def run(ctx):
+        return ctx["Wait"], threading.current_thread().name
+"""
+
+
+class TestAsyncTasks:
+    @pytest.fixture(autouse=True)
+    def async_service(self, tmp_path):
+        (tmp_path / "later" / "tasks").mkdir(parents=True)
+        Service(name="later", description="", tasks=["Wait", "Where"]).save_to_yaml(
+            tmp_path / "later" / "service.yml"
+        )
+        (tmp_path / "later" / "tasks" / "later.py").write_text(ASYNC_TASKS)
+
+        self.man = ServiceManager()
+        self.man.load_services([tmp_path / "later" / "service.yml"])
+
+    def test_async_detected_at_load(self):
+        assert self.man.find_task("Wait").is_async
+        assert not self.man.find_task("Where").is_async
+
+    def test_async_tasks_share_the_loop(self):
+        async def many():
+            return await asyncio.gather(
+                *[self.man.arun_task("Wait") for _ in range(500)]
+            )
+
+        start = time.perf_counter()
+        assert asyncio.run(many()) == ["Wait"] * 500
+        assert time.perf_counter() - start < 1.0
+
+    def test_sync_tasks_run_in_a_thread(self):
+        result, thread = asyncio.run(self.man.arun_task("Where"))
+
+        assert result == "Wait"
+        assert thread.startswith("dizzy-task")
+
+    def test_async_task_runs_synchronously(self):
+        assert self.man.run_task("Where") == ("Wait", "MainThread")